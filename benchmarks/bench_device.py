@@ -0,0 +1,213 @@
+# bench_device.py
+
+from device.simulator.scpi_simulator import SimulatedInstrument, ScpiSimulatorServer, load_settings_config
+from device.base_classes.settings_manager import SettingsManager
+
+from datetime import datetime
+from pathlib import Path
+import argparse
+import json
+import platform
+import tempfile
+import time
+
+import numpy as np
+
+
+def summarize(samples:list[float]) -> dict:
+    """Latency percentiles of a list of samples
+
+    Args:
+        samples (list[float]): Durations in seconds
+
+    Returns:
+        dict: Count, mean, min, max and percentiles in milliseconds
+    """
+    samples_ms = np.asarray(samples) * 1000
+    p50, p90, p99 = np.percentile(samples_ms, [50, 90, 99])
+    return {
+        "count": len(samples_ms),
+        "mean_ms": float(samples_ms.mean()),
+        "min_ms": float(samples_ms.min()),
+        "p50_ms": float(p50),
+        "p90_ms": float(p90),
+        "p99_ms": float(p99),
+        "max_ms": float(samples_ms.max()),
+    }
+
+
+def time_calls(function, repeats:int) -> list[float]:
+    """Times repeated calls of a function
+
+    Args:
+        function (Callable): Function without arguments
+        repeats (int): Number of calls
+
+    Returns:
+        list[float]: Duration of every call in seconds
+    """
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def bench_settings(device:SettingsManager, repeats:int) -> dict:
+    """Benchmarks applying and verifying every setting of the default mode
+
+    Args:
+        device (SettingsManager): Device connected to the simulator
+        repeats (int): Number of runs of every operation
+
+    Returns:
+        dict: Results per operation
+    """
+    names = [name for name, setting in device.settings.items() if setting.is_applicable(device.current_mode) and hasattr(setting, "get_write_scpi_command")]
+    values = {name: device.settings[name].default_value for name in names}
+
+    results = {}
+    for batched in (False, True):
+        def apply():
+            device.invalidate_settings() # Measure the writes, not the skipped writes
+            device.set_all_settings(values, batched=batched)
+            if not batched:
+                device.query_command('*OPC?') # The batched path already ends with one, time both up to the instrument being done
+        results[f"set_all_settings{'_batched' if batched else ''}"] = summarize(time_calls(apply, repeats))
+
+    for bulk in (False, True):
+        results[f"verify_all_settings{'_bulk' if bulk else ''}"] = summarize(time_calls(lambda: device.verify_all_settings(names, bulk=bulk), repeats))
+
+    modes = list(device.modes)
+    default_mode = device.current_mode
+    mode_cycle = iter(modes * repeats)
+    def switch_mode():
+        device.set_mode(next(mode_cycle))
+        device.query_command('*OPC?')
+    results["set_mode"] = summarize(time_calls(switch_mode, repeats))
+    device.set_mode(default_mode)
+
+    return results
+
+
+def bench_traces(device:SettingsManager, point_counts:list[int], repeats:int) -> dict:
+    """Benchmarks reading traces of different lengths in binary and ASCII
+
+    Args:
+        device (SettingsManager): Device connected to the simulator
+        point_counts (list[int]): Trace lengths to test
+        repeats (int): Number of traces read per length and format
+
+    Returns:
+        dict: Results per trace length and format
+    """
+    results = {}
+    for points in point_counts:
+        device.set_setting("Number of Points", str(points))
+        for binary in (True, False):
+            samples = time_calls(lambda: device.query_trace("TRACE1", binary), repeats)
+            result = summarize(samples)
+            result["traces_per_second"] = len(samples) / sum(samples)
+            results[f"{points}_{'binary' if binary else 'ascii'}"] = result
+    return results
+
+
+def write_spectrogram_csv(file_path:Path, frames:int, points:int) -> None:
+    """Writes a synthetic spectrogram CSV in the format exported by the FSW
+
+    Args:
+        file_path (Path): Where to write the file
+        frames (int): Number of frames
+        points (int): Number of points per frame
+    """
+    frequencies = np.linspace(1e9, 2e9, points)
+    rng = np.random.default_rng(0)
+    with open(file_path, "w") as file:
+        # The header ends with the frame and point counts, the parser skips everything up to and including the Frames line
+        file.write(f"Type;FSW-43;\nVersion;1.00;\nMode;Real-Time Spectrum;\nFrames;{frames};\nValues;{points};\n")
+        for frame in range(frames):
+            file.write(f"Frame;{frame};\nTimestamp;{frame * 0.1:.3f};\n")
+            amplitudes = rng.normal(-90, 1.5, points)
+            file.writelines(f"{frequency};{amplitude:.2f};\n" for frequency, amplitude in zip(frequencies, amplitudes))
+
+
+def bench_parsing(frames:int, spectrogram_points:int, points:int, repeats:int) -> dict:
+    """Benchmarks the spectrogram CSV parser and the trace logger on synthetic data
+
+    Args:
+        frames (int): Spectrogram frames
+        spectrogram_points (int): Points per spectrogram frame, the parser's time grows with frames times points squared
+        points (int): Points per logged trace
+        repeats (int): Number of runs
+
+    Returns:
+        dict: Results per operation
+    """
+    # The GUI modules are only needed here
+    from ui.fsw_gui.mode_rts import read_spectrogram_csv
+    from ui.common_gui.csv_logger import TraceLogger
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        spectrogram_path = Path(directory) / "spectrogram.csv"
+        write_spectrogram_csv(spectrogram_path, frames, spectrogram_points)
+        results["read_spectrogram_csv"] = summarize(time_calls(lambda: read_spectrogram_csv(spectrogram_path), repeats))
+        results["read_spectrogram_csv"]["size"] = {"frames": frames, "points": spectrogram_points}
+
+        logger = TraceLogger()
+        logger.start_logging(Path(directory) / "traces.csv")
+        x = np.linspace(1e9, 2e9, points)
+        y = np.random.default_rng(0).normal(-90, 1.5, points).astype(np.float32)
+        results["log_trace"] = summarize(time_calls(lambda: logger.log_trace(x, y), repeats))
+        results["log_trace"]["points"] = points
+        logger.stop_logging()
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the device and parsing paths against the simulator")
+    parser.add_argument("--config", default=str(Path("device") / "configs" / "settings" / "fsw_settings.json"), help="Device settings config to simulate")
+    parser.add_argument("--latency", type=float, default=1.0, help="Simulated latency per message in milliseconds")
+    parser.add_argument("--jitter", type=float, default=0.5, help="Simulated jitter per message in milliseconds")
+    parser.add_argument("--repeats", type=int, default=20, help="Runs of every operation")
+    parser.add_argument("--points", type=int, nargs="+", default=[1001, 10001, 100001], help="Trace lengths to benchmark")
+    parser.add_argument("--frames", type=int, default=20, help="Frames in the synthetic spectrogram")
+    parser.add_argument("--spectrogram-points", type=int, default=1001, help="Points per frame of the synthetic spectrogram")
+    parser.add_argument("--skip-parsing", action="store_true", help="Skip the benchmarks that need the GUI modules")
+    parser.add_argument("--output", default="bench_results.json", help="JSON file to write the results to")
+    args = parser.parse_args()
+
+    instrument = SimulatedInstrument(load_settings_config(args.config), seed=0)
+    server = ScpiSimulatorServer(instrument, port=0, latency=args.latency / 1000, jitter=args.jitter / 1000)
+    server.start()
+
+    device = SettingsManager(server.resource_name, args.config)
+
+    results = {
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "simulator": {"config": args.config, "latency_ms": args.latency, "jitter_ms": args.jitter},
+        "settings": bench_settings(device, args.repeats),
+        "traces": bench_traces(device, args.points, args.repeats),
+    }
+    device.close()
+    server.shutdown()
+
+    if not args.skip_parsing:
+        results["parsing"] = bench_parsing(args.frames, args.spectrogram_points, max(args.points), args.repeats)
+
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=4)
+
+    for section in ("settings", "traces", "parsing"):
+        for name, result in results.get(section, {}).items():
+            rate = f", {result['traces_per_second']:.1f} traces/s" if "traces_per_second" in result else ""
+            print(f"{section:>8} {name:<32} p50 {result['p50_ms']:9.3f} ms  p99 {result['p99_ms']:9.3f} ms{rate}")
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# bench_import.py
+
+from datetime import datetime
+from pathlib import Path
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+
+def first_paint() -> dict:
+    """Starts the GUI like main.py up to the first paint of the connect dialog, runs in a fresh interpreter
+
+    Returns:
+        dict: Milliseconds from the first import to every step
+    """
+    start = time.perf_counter()
+    marks = {}
+
+    import main
+    from PySide6.QtCore import QEvent, QObject
+    from PySide6.QtWidgets import QApplication
+    from ui.common_gui.connect_dialog import IpEntryDialog
+    marks["imports"] = time.perf_counter()
+
+    app = QApplication(sys.argv)
+    app.setStyleSheet(main.load_stylesheet(Path("styles") / "style.qss"))
+    dialog = IpEntryDialog()
+    marks["dialog_created"] = time.perf_counter()
+
+    class PaintWatcher(QObject):
+        def eventFilter(self, watched, event):
+            if event.type() == QEvent.Paint and "first_paint" not in marks:
+                marks["first_paint"] = time.perf_counter()
+                app.quit()
+            return False
+
+    watcher = PaintWatcher()
+    dialog.installEventFilter(watcher)
+    dialog.show()
+    app.exec()
+
+    return {name: (mark - start) * 1000 for name, mark in marks.items()}
+
+
+def parse_importtime(stderr:str, top:int) -> list[dict]:
+    """Gets the slowest imports from the output of python -X importtime
+
+    Args:
+        stderr (str): Standard error of the run
+        top (int): Number of imports to keep
+
+    Returns:
+        list[dict]: Module name and cumulative import time in milliseconds, slowest first
+    """
+    imports = []
+    for line in stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)", line)
+        if match:
+            imports.append({"module": match.group(4), "cumulative_ms": int(match.group(2)) / 1000, "depth": (len(match.group(3)) - 1) // 2})
+    top_level = [entry for entry in imports if entry["depth"] == 0]
+    return sorted(top_level, key=lambda entry: entry["cumulative_ms"], reverse=True)[:top]
+
+
+def run_once(importtime:bool) -> tuple[float, dict, str]:
+    """Runs first_paint in a new interpreter
+
+    Args:
+        importtime (bool): Run with -X importtime
+
+    Returns:
+        tuple: Wall time to first paint in milliseconds, the steps reported by the child, and its standard error
+    """
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-m", "benchmarks.bench_import", "--child"]
+    start = time.perf_counter()
+    process = subprocess.run(command, capture_output=True, text=True, env=os.environ.copy())
+    wall_ms = (time.perf_counter() - start) * 1000
+
+    if process.returncode != 0:
+        raise RuntimeError(f"Startup run failed:\n{process.stderr}")
+    steps = json.loads(process.stdout.strip().splitlines()[-1])
+    return wall_ms, steps, process.stderr
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the cold start of the GUI up to the first painted window")
+    parser.add_argument("--repeats", type=int, default=10, help="Number of cold starts")
+    parser.add_argument("--top", type=int, default=15, help="Slowest imports to report")
+    parser.add_argument("--output", default="bench_import.json", help="JSON file to write the results to")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(first_paint()))
+        return
+
+    runs = [run_once(False)[:2] for _ in range(args.repeats)]
+    _, _, importtime_stderr = run_once(True)
+
+    wall = np.array([wall_ms for wall_ms, _ in runs])
+    steps = {name: float(np.median([run_steps[name] for _, run_steps in runs])) for name in runs[0][1]}
+
+    results = {
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeats": args.repeats,
+        "wall_to_first_paint_ms": {
+            "mean_ms": float(wall.mean()),
+            "min_ms": float(wall.min()),
+            "p50_ms": float(np.percentile(wall, 50)),
+            "max_ms": float(wall.max()),
+        },
+        "median_steps_ms": steps, # Measured inside the interpreter, without its own start up
+        "slowest_imports": parse_importtime(importtime_stderr, args.top),
+    }
+
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=4)
+
+    print(f"Wall time to first paint: p50 {results['wall_to_first_paint_ms']['p50_ms']:.1f} ms, min {results['wall_to_first_paint_ms']['min_ms']:.1f} ms")
+    for name, value in steps.items():
+        print(f"{name:>16} {value:9.1f} ms")
+    for entry in results["slowest_imports"]:
+        print(f"{entry['module']:>32} {entry['cumulative_ms']:9.1f} ms")
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# command_stats.py
+
+from bisect import bisect_left
+import json
+import threading
+
+
+class CommandStats():
+    bucket_edges_ms = (0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000) # Upper edges of the latency histogram buckets
+
+    def __init__(self):
+        """Latency, byte and error counts per SCPI command prefix. Nothing is recorded until it is enabled"""
+        self.enabled = False
+        self.lock = threading.Lock() # Traces are read from a worker thread
+        self.commands = {}
+        self.last_latency = 0.0
+
+
+    @staticmethod
+    def prefix(command:str) -> str:
+        """Gets the prefix a command is recorded under, the header of its first query or else its first command
+
+        Args:
+            command (str): The SCPI message
+
+        Returns:
+            str: The header, compound messages are marked with ';...'
+        """
+        headers = [part.strip().lstrip(":").split(" ", 1)[0].upper() for part in command.split(";")]
+        header = next((header for header in headers if header.endswith("?")), headers[0])
+        return f"{header};..." if len(headers) > 1 else header
+
+
+    def record(self, command:str, seconds:float, bytes_sent:int, bytes_received:int = 0, error:bool = False) -> None:
+        """Records one command
+
+        Args:
+            command (str): The SCPI message
+            seconds (float): Time from sending the command to the end of the response
+            bytes_sent (int): Length of the message
+            bytes_received (int, optional): Length of the response. Defaults to 0.
+            error (bool, optional): True if the command raised an error. Defaults to False.
+        """
+        prefix = self.prefix(command)
+        latency_ms = seconds * 1000
+
+        with self.lock:
+            entry = self.commands.get(prefix)
+            if entry is None:
+                entry = self.commands[prefix] = {
+                    "count": 0,
+                    "errors": 0,
+                    "total_ms": 0.0,
+                    "min_ms": latency_ms,
+                    "max_ms": latency_ms,
+                    "bytes_sent": 0,
+                    "bytes_received": 0,
+                    "histogram": [0] * (len(self.bucket_edges_ms) + 1), # Last bucket holds everything above the last edge
+                }
+            entry["count"] += 1
+            entry["errors"] += error
+            entry["total_ms"] += latency_ms
+            entry["min_ms"] = min(entry["min_ms"], latency_ms)
+            entry["max_ms"] = max(entry["max_ms"], latency_ms)
+            entry["bytes_sent"] += bytes_sent
+            entry["bytes_received"] += bytes_received
+            entry["histogram"][bisect_left(self.bucket_edges_ms, latency_ms)] += 1
+            self.last_latency = latency_ms
+
+
+    def reset(self) -> None:
+        """Forgets everything recorded so far"""
+        with self.lock:
+            self.commands = {}
+            self.last_latency = 0.0
+
+
+    def summary(self) -> dict:
+        """Gets a copy of the recorded stats
+
+        Returns:
+            dict: Stats per command prefix, including the mean latency
+        """
+        with self.lock:
+            summary = {prefix: dict(entry, histogram=list(entry["histogram"])) for prefix, entry in self.commands.items()}
+        for entry in summary.values():
+            entry["mean_ms"] = entry["total_ms"] / entry["count"]
+        return summary
+
+
+    def dump_json(self, filepath:str) -> None:
+        """Writes the recorded stats to a JSON file
+
+        Args:
+            filepath (str): File to write
+        """
+        with open(filepath, "w") as file:
+            json.dump({"bucket_edges_ms": list(self.bucket_edges_ms), "commands": self.summary()}, file, indent=4)
+
+
+    def status_text(self) -> str:
+        """Short readout of the totals
+
+        Returns:
+            str: Command count, mean and last latency, and error count
+        """
+        with self.lock:
+            count = sum(entry["count"] for entry in self.commands.values())
+            errors = sum(entry["errors"] for entry in self.commands.values())
+            total_ms = sum(entry["total_ms"] for entry in self.commands.values())
+            last = self.last_latency
+        mean = total_ms / count if count else 0.0
+        return f"SCPI: {count} cmds, mean {mean:.1f} ms, last {last:.1f} ms, {errors} errors"
@@ -0,0 +1,189 @@
+# config_registry.py
+
+from pathlib import Path
+import json
+import os
+import threading
+
+
+class ConfigRegistry():
+    settings_directory = Path("device") / "configs" / "settings"
+    device_types_filepath = Path("device") / "configs" / "device_types" / "configs.json"
+    index_filepath = Path("device") / "configs" / "settings_index.json" # IDNs of the settings configs, kept between runs
+
+    def __init__(self, settings_directory:str | Path = None, device_types_filepath:str | Path = None, index_filepath:str | Path = None):
+        """Finds and loads the device configs. Parsed files are cached until their modification time changes,
+        and the IDN of every settings config is indexed so a lookup does not open every file
+
+        Args:
+            settings_directory (str | Path, optional): Folder with the settings configs. Defaults to device/configs/settings.
+            device_types_filepath (str | Path, optional): File mapping device types to settings configs. Defaults to device/configs/device_types/configs.json.
+            index_filepath (str | Path, optional): Where the IDN index is saved between runs. Defaults to device/configs/settings_index.json.
+        """
+        self.settings_directory = Path(settings_directory or self.settings_directory)
+        self.device_types_filepath = Path(device_types_filepath or self.device_types_filepath)
+        self.index_filepath = Path(index_filepath or self.index_filepath)
+
+        self.lock = threading.Lock()
+        self.cache = {} # File path: (modification time, parsed config)
+        self.entries = {} # File name: {"mtime": modification time, "idn": IDN of the config}
+        self.index = {} # IDN key: list of file paths
+        self.directory_mtime = None
+
+        self._load_saved_index()
+
+
+    @staticmethod
+    def idn_key(idn:str) -> str:
+        """Gets the part of an IDN that identifies the model, the manufacturer and model fields
+
+        Args:
+            idn (str): IDN of an instrument or of a config
+
+        Returns:
+            str: Upper case manufacturer and model separated by a comma
+        """
+        fields = [field.strip().upper() for field in idn.split(",")]
+        return ",".join(fields[:2])
+
+
+    def load(self, filepath:str | Path) -> dict:
+        """Loads a config file, a file that did not change since the last load is not parsed again
+
+        Args:
+            filepath (str | Path): JSON file to load
+
+        Returns:
+            dict: The parsed config
+        """
+        filepath = Path(filepath)
+        mtime = filepath.stat().st_mtime_ns
+
+        with self.lock:
+            cached = self.cache.get(filepath)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+
+        with open(filepath, "r") as file:
+            config = json.load(file)
+
+        with self.lock:
+            self.cache[filepath] = (mtime, config)
+        return config
+
+
+    def find_config(self, idn:str) -> tuple[Path, dict] | None:
+        """Finds the settings config of an instrument
+
+        Args:
+            idn (str): IDN returned by the instrument
+
+        Returns:
+            tuple[Path, dict] | None: Path and contents of the config, None if no config matches
+        """
+        self.refresh_index()
+
+        candidates = self.index.get(self.idn_key(idn), [])
+        if not candidates:
+            # Configs with an IDN that is not "manufacturer,model" are only found by the old substring match
+            candidates = [self.settings_directory / name for name, entry in self.entries.items() if entry["idn"] and entry["idn"] in idn]
+
+        for filepath in candidates:
+            config = self.load(filepath)
+            if config.get("IDN", "") in idn:
+                return filepath, config
+
+        if candidates:
+            return candidates[0], self.load(candidates[0]) # Same model, the serial or firmware fields of the config did not match
+        return None
+
+
+    def device_type_filepath(self, device_type:str) -> Path:
+        """Gets the settings config of a device type listed in the device types file
+
+        Args:
+            device_type (str): Device type, e.g. "Rhode & Schwarz FSW-43"
+
+        Returns:
+            Path: Path to the settings config
+        """
+        filepath = Path(self.load(self.device_types_filepath)[device_type])
+        if not filepath.is_file():
+            filepath = self.settings_directory / filepath.name # Absolute paths written on another machine
+        return filepath
+
+
+    def refresh_index(self) -> None:
+        """Updates the IDN index, only files that were added or changed since the last refresh are opened. The files
+        are only listed when the folder changed, a file edited in place is still reloaded by load once it is a candidate"""
+        try:
+            directory_mtime = self.settings_directory.stat().st_mtime_ns
+        except FileNotFoundError:
+            return
+
+        if directory_mtime == self.directory_mtime:
+            return # No file was added, removed or replaced since the last refresh, one stat instead of one per file
+
+        entries = {}
+
+        with os.scandir(self.settings_directory) as files:
+            for file in files:
+                if not file.name.endswith(".json") or not file.is_file():
+                    continue
+
+                mtime = file.stat().st_mtime_ns
+                entry = self.entries.get(file.name)
+                if entry is None or entry["mtime"] != mtime:
+                    try:
+                        entry = {"mtime": mtime, "idn": self.load(file.path).get("IDN", "")}
+                    except (OSError, ValueError) as ex:
+                        print(f'Could not read config {file.path}:\n{ex}') # Error
+                        continue
+                entries[file.name] = entry
+
+        index = {}
+        for name, entry in sorted(entries.items()):
+            index.setdefault(self.idn_key(entry["idn"]), []).append(self.settings_directory / name)
+
+        save = entries != self.entries # Nothing new to save when only the saved index was indexed
+        self.entries = entries
+        self.index = index
+        self.directory_mtime = directory_mtime
+        if save:
+            self._save_index()
+
+
+    def _load_saved_index(self) -> None:
+        """Loads the index saved by an earlier run, refresh_index checks it against the files"""
+        try:
+            with open(self.index_filepath, "r") as file:
+                saved = json.load(file)
+        except (OSError, ValueError):
+            return
+
+        if saved.get("settings_directory") == str(self.settings_directory):
+            self.entries = saved.get("entries", {})
+
+
+    def _save_index(self) -> None:
+        """Saves the index for the next run, a read only install just rebuilds it every time"""
+        try:
+            with open(self.index_filepath, "w") as file:
+                json.dump({"settings_directory": str(self.settings_directory), "entries": self.entries}, file, indent=4)
+        except OSError:
+            pass
+
+
+_registry = None # One registry for the whole app
+
+
+def get_config_registry() -> ConfigRegistry:
+    """Gets the ConfigRegistry shared by the app, creating it on first use
+
+    Returns:
+        ConfigRegistry: The registry of the default config folders
+    """
+    global _registry
+    if _registry is None:
+        _registry = ConfigRegistry()
+    return _registry
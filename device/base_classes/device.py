@@ -1,29 +1,53 @@
 # device.py
 
-from pyvisa import ResourceManager
+from device.base_classes.command_stats import CommandStats
+
+from device.base_classes.session import get_resource_manager, open_session
+
+import numpy as np
+import threading
+import time
+
 
 class Instrument():
-    def __init__(self, ip_address:str):
+    binary_format_command = 'FORM REAL,32' # Command that selects little endian REAL,32 trace blocks
+    max_message_length = 1024 # Longest compound message sent in one write, kept well inside the instrument's input buffer
+    
+    def __init__(self, ip_address:str, transport:str = "VXI-11", session = None, idn:str = None, reset:bool = True):
         """ Initialize the Instrument
 
         Args:
             ip_address (str): String with the IP address of the instrument
-            visa_timeout (int): Visa timeout in milliseconds
-            opc_timeout (int): OPC timeout in milliseconds
+            transport (str): One of the TRANSPORTS, "VXI-11", "HiSLIP" or "Socket"
+            session (pyvisa.resources.MessageBasedResource, optional): Open session from open_session, reused instead of connecting again
+            idn (str, optional): IDN of the instrument on the session, queried if not given
+            reset (bool, optional): Send *RST after connecting. Defaults to True, False keeps the instrument's configuration
         """
-        self.rm = ResourceManager("@py")
-        try:
-            self.instrument = self.rm.open_resource(f"TCPIP::{ip_address}::INSTR")
-        except Exception as ex:
-            print(f'Error initializing the instrument session:\n{ex.args[0]}') # Error
-            exit()
+        self.lock = threading.RLock() # Serializes access to the session, traces are read from a worker thread
+        
+        self.stats = CommandStats() # Per command latency, off until enabled with enable_stats
+        self.trace_parse_time = 0.0 # Seconds the last trace took to convert after it was read
+        
+        self.rm = get_resource_manager() # Shared with the rest of the app
         
-        self.idn = self.instrument.query('*IDN?')
+        if session is None:
+            # A full VISA resource string can be passed instead of an IP address, e.g. to reach the simulator
+            try:
+                session, idn = open_session(ip_address, transport)
+            except Exception as ex:
+                print(f'Error initializing the instrument session:\n{ex.args[0]}') # Error
+                exit()
+        
+        self.instrument = session
+        
+        self.idn = idn if idn is not None else self.instrument.query('*IDN?')
         print(f'Hello I am: {self.idn}') # Asks the FSW it's ID
         
-        self.write_command('*RST') # Reset the instrument
+        if reset:
+            self.reset() # Reset the instrument
         
         self.ip_address = ip_address # Store the ip address
+        self.transport = transport
     
     
     def write_command(self, command:str) -> None:
@@ -32,7 +56,7 @@ class Instrument():
         Args:
             command (str): The command to be written
         """
-        self.instrument.write(command)
+        self._run(command, self.instrument.write, command)
     
     
     def query_command(self, command:str) -> str:
@@ -44,10 +68,121 @@ class Instrument():
         Returns:
             str: The value returned from the instrument
         """
-        return self.instrument.query(command)
+        return self._run(command, self.instrument.query, command)
+    
+    
+    def _run(self, command:str, function, *args, **kwargs):
+        """Runs a session call while holding the lock, and records it if stats are enabled
+
+        Args:
+            command (str): The SCPI message, used for the stats
+            function (Callable): The session method to call
+
+        Returns:
+            Any: What the session method returned
+        """
+        with self.lock:
+            if not self.stats.enabled:
+                return function(*args, **kwargs)
+            
+            start = time.perf_counter()
+            try:
+                result = function(*args, **kwargs)
+            except Exception:
+                self.stats.record(command, time.perf_counter() - start, len(command), error=True)
+                raise
+            
+            if isinstance(result, np.ndarray):
+                received = result.nbytes
+            elif isinstance(result, str):
+                received = len(result)
+            else:
+                received = 0 # Writes return the number of bytes sent
+            self.stats.record(command, time.perf_counter() - start, len(command), received)
+            return result
+    
+    
+    def enable_stats(self, enabled:bool = True) -> None:
+        """Turns the per command latency stats on or off
+
+        Args:
+            enabled (bool, optional): True to record every command. Defaults to True.
+        """
+        self.stats.enabled = enabled
+    
+    
+    def dump_stats(self, filepath:str) -> None:
+        """Writes the per command latency stats to a JSON file
+
+        Args:
+            filepath (str): File to write
+        """
+        self.stats.dump_json(filepath)
+    
+    
+    def reset(self) -> None:
+        """Resets the instrument to its default state"""
+        self.write_command('*RST')
+    
+    
+    def join_commands(self, commands:list[str]) -> str:
+        """Joins commands into one compound SCPI message
+
+        Args:
+            commands (list[str]): The commands to join, each one is an absolute command from the root
+
+        Returns:
+            str: Compound message, every command after the first is prefixed with ':' so it starts again from the root
+        """
+        parts = []
+        for command in commands:
+            command = command.strip()
+            if not command:
+                continue
+            if parts and not command.startswith(('*', ':')):
+                command = f":{command}"
+            parts.append(command)
+        return ";".join(parts)
+    
+    
+    def query_trace(self, trace:str = "TRACE1", binary:bool = True) -> np.ndarray:
+        """Query a trace from the instrument
+
+        Args:
+            trace (str, optional): The trace to read. Defaults to "TRACE1".
+            binary (bool, optional): Transfer the trace as an IEEE block of REAL,32 values instead of ASCII. Defaults to True.
+
+        Returns:
+            np.ndarray: float32 array of the trace values
+        """
+        if binary:
+            # Little endian block, decoded straight into a numpy array by np.frombuffer while it is read
+            self.trace_parse_time = 0.0
+            command = f'{self.binary_format_command};:TRAC:DATA? {trace}'
+            return self._run(
+                command,
+                self.instrument.query_binary_values,
+                command,
+                datatype='f',
+                is_big_endian=False,
+                container=np.ndarray,
+                )
+        
+        response = self.query_command(f'FORM ASC;:TRAC:DATA? {trace}')
+        start = time.perf_counter()
+        values = np.fromstring(response, dtype=np.float32, sep=',')
+        self.trace_parse_time = time.perf_counter() - start
+        return values
+    
+    
+    def clear(self) -> None:
+        """Sends a device clear, drops any half read response left on the session"""
+        with self.lock:
+            self.instrument.clear()
     
     
     def close(self) -> None:
         """Closes the instrument session"""
-        self.instrument.close()
+        with self.lock:
+            self.instrument.close()
     
\ No newline at end of file
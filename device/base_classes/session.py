@@ -0,0 +1,89 @@
+# session.py
+
+import socket
+
+
+# VISA resource strings of the supported LAN transports, from the slowest to the fastest
+TRANSPORTS = {
+    "VXI-11": "TCPIP::{ip_address}::INSTR",
+    "HiSLIP": "TCPIP::{ip_address}::hislip0::INSTR",
+    "Socket": "TCPIP::{ip_address}::5025::SOCKET",
+}
+
+_resource_manager = None # One ResourceManager for the whole app
+
+
+def get_resource_manager():
+    """Gets the ResourceManager shared by the app, creating it on first use
+
+    Returns:
+        ResourceManager: The pyvisa-py resource manager
+    """
+    global _resource_manager
+    if _resource_manager is None:
+        from pyvisa import ResourceManager # pyvisa is only imported once a connection is made
+        _resource_manager = ResourceManager("@py")
+    return _resource_manager
+
+
+def get_resource_name(ip_address:str, transport:str = "VXI-11") -> str:
+    """Builds the VISA resource string for an instrument
+
+    Args:
+        ip_address (str): IP address of the instrument, or a full VISA resource string which is returned as is
+        transport (str, optional): One of the TRANSPORTS. Defaults to "VXI-11".
+
+    Returns:
+        str: VISA resource string
+    """
+    if "::" in ip_address:
+        return ip_address
+    return TRANSPORTS[transport].format(ip_address=ip_address)
+
+
+def configure_socket(session) -> None:
+    """Sets up a raw socket session, which has no end of message and Nagle's algorithm on by default
+
+    Args:
+        session (pyvisa.resources.TCPIPSocket): The session to set up
+    """
+    # The newline marks the end of a message
+    session.read_termination = "\n"
+    session.write_termination = "\n"
+    
+    from pyvisa import constants
+    
+    # Without TCP_NODELAY a query sent right after a write waits for the delayed ACK, about 40 ms
+    try:
+        session.set_visa_attribute(constants.ResourceAttribute.tcpip_nodelay, True)
+    except Exception:
+        try:
+            # pyvisa-py does not implement the attribute setter, set it on its socket directly
+            session.visalib.sessions[session.session].interface.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except Exception as ex:
+            print(f'Could not disable Nagle on the socket:\n{ex}')
+
+
+def open_session(ip_address:str, transport:str = "VXI-11") -> tuple:
+    """Opens one session to an instrument and identifies it. The session can be handed to Instrument so it does not connect again
+
+    Args:
+        ip_address (str): IP address of the instrument, or a full VISA resource string
+        transport (str, optional): One of the TRANSPORTS. Defaults to "VXI-11".
+
+    Returns:
+        tuple: The open session and the instrument's IDN
+    """
+    resource_name = get_resource_name(ip_address, transport)
+    session = get_resource_manager().open_resource(resource_name)
+    
+    if resource_name.upper().endswith("::SOCKET"):
+        configure_socket(session)
+    
+    try:
+        idn = session.query('*IDN?')
+    except Exception:
+        session.close()
+        raise
+    
+    return session, idn
@@ -1,45 +1,59 @@
 # settings_manager.py
 
 from device.base_classes.device import Instrument
+from device.base_classes.shadow_state import ShadowState
+from device.base_classes.config_registry import get_config_registry
 from device.setting_classes.numerical_setting import NumericalSetting
 from device.setting_classes.mode_setting import ModeSetting
 from device.setting_classes.display_setting import DisplaySetting
 
-import json
 import math
-import os
+import time
 
 class SettingsManager(Instrument):
-    def __init__(self, ip_address:str, settings_config_filepath:str = None):
+    sweep_timeout_margin = 5000 # Milliseconds added to twice the sweep time while waiting for a sweep
+    sweep_poll_period = 20 # Milliseconds between the *ESR? polls while waiting for a sweep
+    
+    def __init__(self, ip_address:str, settings_config_filepath:str = None, transport:str = "VXI-11", session = None, idn:str = None, attach:bool = False, persistent_channels:bool = False):
         """Initializes the Setting Manager instrument that controls all the settings on the instrument
 
         Args:
             ip_address (str): IP Address of the instrument
             default_config_filepath (str): String containing a file path to the setting config file
+            transport (str): VISA transport to connect with, "VXI-11", "HiSLIP" or "Socket"
+            session (pyvisa.resources.MessageBasedResource, optional): Session already opened with open_session, reused instead of connecting again
+            idn (str, optional): IDN already queried on the session
+            attach (bool, optional): Keep the instrument's configuration instead of resetting it, the mode and values are read back. Defaults to False.
+            persistent_channels (bool, optional): Keep one measurement channel per mode and switch with INST:SEL instead of replacing the channel. Defaults to False.
             visa_timeout (int): Visa timeout in milliseconds
             opc_timeout (int): OPC timeout in milliseconds
         """
-        super().__init__(ip_address)
+        self.persistent_channels = persistent_channels
+        self.shadow = ShadowState() # What is known about the instrument's values, everything starts unknown
+        
+        self.open_channels = set() # Modes that have a measurement channel on the instrument, used with persistent_channels
+        self.channel_snapshots = {} # Mode: values and shadow states of a channel that is not selected
+        self.channel_names = {} # Mode: name of its channel on the instrument, for channels found by attach that are not named after their mode
+        self.mode_snapshots = {} # Mode: last applied or verified values of its settings, restored when a replaced channel comes back
+        self.sweep_count = 0 # Sweeps completed by sweep_and_wait
+        
+        super().__init__(ip_address, transport, session, idn, reset=not attach)
+        
+        registry = get_config_registry()
         
         if not settings_config_filepath:
-            directory = r"device\configs\settings"
+            match = registry.find_config(self.idn) # Indexed by IDN, only new or changed configs are opened
             
-            for filename in os.listdir(directory):
-                
-                filepath = os.path.join(directory, filename)
-                
-                if filename.endswith('.json') and os.path.isfile(filepath):
-                    with open(filepath, 'r') as file:
-                        data = json.load(file)
-                    
-                    if data.get("IDN","") in self.idn:
-                        config = data
-                        self.device_type = data.get("Device Name")
+            if match is None:
+                raise ValueError(f'No settings config found for {self.idn.strip()}')
+            
+            _, config = match
+            self.device_type = config.get("Device Name")
         else:
-            with open(settings_config_filepath, 'r') as file: # Opens file containing all the settings
-                config = json.load(file)
+            config = registry.load(settings_config_filepath) # Opens file containing all the settings
         
-        self.current_mode = config["Default Mode"] # Default mode on startup
+        self.default_mode = config["Default Mode"]
+        self.current_mode = self.default_mode # Default mode on startup
         
         self.mode_scpi = config["Modes SCPI Commands"] # Scpi commands to change modes
         
@@ -51,6 +65,9 @@ class SettingsManager(Instrument):
         self.display_settings = {name: DisplaySetting.from_dict(name,**setting) for name, setting in config["Settings"].items() if setting["setting_type"] == "display"}
         
         self.settings = self.mode_settings | self.numerical_settings | self.display_settings
+        
+        if attach:
+            self.attach()
     
     
     def setting_known(self, setting_name:str) -> bool:
@@ -77,28 +94,150 @@ class SettingsManager(Instrument):
         return self.settings[setting_name]
     
     
-    def set_all_settings(self, settings:dict[str,str]) -> dict[str, tuple[bool, str]]:
+    def set_all_settings(self, settings:dict[str,str], batched:bool = False) -> dict[str, tuple[bool, str]]:
         """Sets a whole dictionary of settings on the instrument
 
         Args:
             settings (dict): Input dictionary of settings to set. The dict has setting name as keys and setting values as values
+            batched (bool, optional): Send the settings as a few compound messages, each followed by one *OPC? and error check, instead of one write per command. Defaults to False.
 
         Returns:
             dict: returns a dictionary of results from the process of setting the settings. 
             Keys are the setting names, values are tuples containing a boolean for results and a status string
         """
+        if batched:
+            return self.set_all_settings_batched(settings)
         return {name: self.set_setting(name, value) for name, value in settings.items()}
     
     
-    def set_setting(self, setting_name:str, value:str) -> tuple[bool, str]:
-        """Sets a single setting
+    def set_all_settings_batched(self, settings:dict[str,str]) -> dict[str, tuple[bool, str]]:
+        """Validates all the settings locally, then writes them as compound messages that fit in max_message_length.
+        Every message is followed by one *OPC?;:SYST:ERR? query. An instrument may drop the rest of a message after a
+        rejected command, so the settings of a message with errors are written again one at a time to find the ones that failed
+
+        Args:
+            settings (dict): Input dictionary of settings to set. The dict has setting name as keys and setting values as values
+
+        Returns:
+            dict: Same results as set_all_settings, keys are the setting names, values are tuples containing a boolean for results and a status string
+        """
+        results = {}
+        messages = [] # List of [message, names of the settings in the message]
+        
+        for name, value in settings.items():
+            valid, status = self.validate_setting(name, value)
+            if not valid:
+                results[name] = (False, status)
+                continue
+            
+            if self.already_set(name, value):
+                self.shadow.record_skip()
+                results[name] = (True, 'Setting already set')
+                continue
+            
+            # Every setting stays whole inside one message, its commands are joined first
+            command = self.join_commands(self.settings[name].get_write_scpi_command(value).split(";"))
+            
+            if messages and len(messages[-1][0]) + 2 + len(command) <= self.max_message_length:
+                messages[-1][0] = self.join_commands([messages[-1][0], command])
+                messages[-1][1].append(name)
+            else:
+                messages.append([command, [name]])
+        
+        for message, names in messages:
+            try:
+                self.write_command(message)
+                error = self.query_command('*OPC?;:SYST:ERR?').strip().partition(';')[2] # Sync and first error in one round trip
+            except Exception as e:
+                self.shadow.invalidate(names) # Unknown how much of the message was run
+                for name in names:
+                    results[name] = (False, f'Error writing setting: {e}')
+                continue
+            
+            if self.error_code(error) == 0:
+                for name in names:
+                    self.settings[name].set_current_value(settings[name]) # Set the current value in the object
+                    self.shadow.mark_dirty(name)
+                    results[name] = (True, 'Set sucessful')
+                continue
+            
+            self.read_errors() # Empty the queue, the settings are checked one by one below
+            for name in names:
+                results[name] = self.write_checked(name, settings[name])
+        
+        return {name: results[name] for name in settings}
+    
+    
+    def write_checked(self, setting_name:str, value:str) -> tuple[bool, str]:
+        """Writes one setting and reads the error queue after it
+
+        Args:
+            setting_name (str): Name of the setting, already validated
+            value (str): Value of the setting
+
+        Returns:
+            tuple[bool, str]: True if the instrument took the value, and a status string
+        """
+        command = self.join_commands(self.settings[setting_name].get_write_scpi_command(value).split(";"))
+        try:
+            self.write_command(command)
+            errors = self.read_errors()
+        except Exception as e:
+            self.shadow.invalidate([setting_name])
+            return False, f'Error writing setting: {e}'
+        
+        if errors:
+            self.shadow.invalidate([setting_name]) # The instrument kept a value that is not known
+            return False, f'Instrument error: {errors[0]}'
+        
+        self.settings[setting_name].set_current_value(value)
+        self.shadow.mark_dirty(setting_name)
+        return True, 'Set sucessful'
+    
+    
+    def read_errors(self, limit:int = 20) -> list[str]:
+        """Reads the instrument's error queue until it is empty
+
+        Args:
+            limit (int, optional): Most errors read, in case the queue never reports empty. Defaults to 20.
+
+        Returns:
+            list[str]: The errors, oldest first
+        """
+        errors = []
+        for _ in range(limit):
+            error = self.query_command('SYST:ERR?').strip()
+            if self.error_code(error) == 0:
+                break
+            errors.append(error)
+        return errors
+    
+    
+    @staticmethod
+    def error_code(error:str) -> int:
+        """Gets the code of a SYST:ERR? response
+
+        Args:
+            error (str): Response such as 0,"No error"
+
+        Returns:
+            int: The error code, 0 for no error
+        """
+        try:
+            return int(error.split(',', 1)[0])
+        except ValueError:
+            return -1 # Not an error response, treat it as an error
+    
+    
+    def validate_setting(self, setting_name:str, value:str) -> tuple[bool, str]:
+        """Checks locally that a setting can be set to a value in the current mode
 
         Args:
             setting_name (str): Name of the setting to be set
             value (str): Value of the setting
 
         Returns:
-            tuple[bool, str]: Results a tupple containing results, boolean for setting result and string for status
+            tuple[bool, str]: True if the setting can be written, and a status string
         """
         # Checks if the setting is known
         if not self.setting_known(setting_name):
@@ -114,6 +253,30 @@ class SettingsManager(Instrument):
         if not setting.check_if_valid_value(value):
             return False, 'Value is not valid for this setting'
         
+        return True, 'Setting valid'
+    
+    
+    def set_setting(self, setting_name:str, value:str) -> tuple[bool, str]:
+        """Sets a single setting
+
+        Args:
+            setting_name (str): Name of the setting to be set
+            value (str): Value of the setting
+
+        Returns:
+            tuple[bool, str]: Results a tupple containing results, boolean for setting result and string for status
+        """
+        valid, status = self.validate_setting(setting_name, value)
+        if not valid:
+            return False, status
+        
+        # Skip the write if the instrument is known to have this value already
+        if self.already_set(setting_name, value):
+            self.shadow.record_skip()
+            return True, 'Setting already set'
+        
+        setting = self.settings[setting_name] # Get setting object
+        
         # Get SCPI command. The command is stored as a list for settings that require multiple commands to set
         command_list = setting.get_write_scpi_command(value).split(";") 
         try:
@@ -125,22 +288,164 @@ class SettingsManager(Instrument):
             return False, f'Error writing setting: {e}'
         
         setting.set_current_value(value) # Set the current value in the object
+        self.shadow.mark_dirty(setting_name)
         
         return True, 'Set sucessful'
     
     
-    def verify_all_settings(self, settings:list[str]) -> dict[str,tuple[bool, str]]:
+    def already_set(self, setting_name:str, value:str) -> bool:
+        """Checks if the instrument is known to have a setting at a value already
+
+        Args:
+            setting_name (str): Name of the setting
+            value (str): Value that is about to be written
+
+        Returns:
+            bool: True if the setting is in sync and its current value matches
+        """
+        if not self.shadow.is_synced(setting_name):
+            return False
+        
+        return self.value_matches(setting_name, value)
+    
+    
+    def value_matches(self, setting_name:str, value:str) -> bool:
+        """Checks if a setting's current value is a value, numbers are compared as numbers
+
+        Args:
+            setting_name (str): Name of the setting
+            value (str): Value to compare with
+
+        Returns:
+            bool: True if the current value matches
+        """
+        setting = self.settings[setting_name]
+        
+        # Mode settings store the value an alias points to as their current value
+        if isinstance(setting, ModeSetting) and setting.alias is not None:
+            value = setting.alias.get(value, value)
+        
+        if self.is_number(value) and self.compare_number_strings(setting.current_value, value):
+            return True
+        return setting.current_value == value
+    
+    
+    def invalidate_settings(self, setting_names:list[str] = None) -> None:
+        """Forget the known state of settings, use this when the instrument was changed outside this class
+
+        Args:
+            setting_names (list[str], optional): Settings to invalidate. Defaults to None, which invalidates every setting.
+        """
+        self.shadow.invalidate(setting_names)
+    
+    
+    @property
+    def skipped_writes(self) -> int:
+        """Number of writes skipped because the instrument already had the value"""
+        return self.shadow.skipped_writes
+    
+    
+    def reset(self) -> None:
+        """Resets the instrument, after which no setting is known to be in sync"""
+        with self.lock: # *RST switches back to the default mode, current_mode changes with it
+            super().reset()
+            self.shadow.invalidate()
+            
+            # *RST deletes every channel but the default one
+            self.open_channels = set()
+            self.channel_snapshots = {}
+            self.channel_names = {}
+            if hasattr(self, "default_mode"):
+                self.current_mode = self.default_mode
+    
+    
+    def verify_all_settings(self, settings:list[str], bulk:bool = False) -> dict[str,tuple[bool, str]]:
         """Verify a list of settings
 
         Args:
             settings (list): A list of setting names to verify
+            bulk (bool, optional): Chain the query commands into compound queries instead of one query per setting. Defaults to False.
 
         Returns:
             dict: Returns a dictionary with setting names a keys and verify result
         """
+        if bulk:
+            return self.verify_all_settings_bulk(settings)
         return {name: self.verify_setting(name) for name in settings}
     
     
+    def verify_all_settings_bulk(self, settings:list[str]) -> dict[str,tuple[bool, str]]:
+        """Verify a list of settings with compound queries, the responses are split back out per setting
+
+        Args:
+            settings (list): A list of setting names to verify
+
+        Returns:
+            dict: Same results as verify_all_settings, setting names as keys and verify result as values
+        """
+        results = {}
+        queryable = []
+        
+        for name in settings:
+            if not self.setting_known(name):
+                results[name] = (False, 'Setting Unknown')
+            elif not self.settings[name].is_applicable(self.current_mode):
+                results[name] = (False, 'Setting is not applicable')
+            else:
+                queryable.append(name)
+        
+        # Split the queries into chunks that fit in one message
+        chunks = []
+        chunk = []
+        length = 0
+        for name in queryable:
+            command_length = len(self.settings[name].get_query_scpi_command()) + 2
+            if chunk and length + command_length > self.max_message_length:
+                chunks.append(chunk)
+                chunk = []
+                length = 0
+            chunk.append(name)
+            length += command_length
+        if chunk:
+            chunks.append(chunk)
+        
+        for chunk in chunks:
+            results.update(self._verify_chunk(chunk))
+        
+        return {name: results[name] for name in settings}
+    
+    
+    def _verify_chunk(self, names:list[str]) -> dict[str,tuple[bool, str]]:
+        """Verify a chunk of settings in one compound query, splits the chunk in half if the instrument can't answer it
+
+        Args:
+            names (list[str]): Names of known, applicable settings
+
+        Returns:
+            dict: Setting names as keys and verify result as values
+        """
+        if len(names) == 1:
+            return {names[0]: self.verify_setting(names[0])}
+        
+        command = self.join_commands([self.settings[name].get_query_scpi_command() for name in names])
+        
+        try:
+            responses = self.query_command(command).strip().split(";")
+        except Exception:
+            responses = None
+            try:
+                self.clear() # Drop whatever part of the response is left on the session
+            except Exception:
+                pass
+        
+        # Response too long, lost or malformed, try again with smaller messages
+        if responses is None or len(responses) != len(names):
+            half = len(names) // 2
+            return self._verify_chunk(names[:half]) | self._verify_chunk(names[half:])
+        
+        return {name: self.check_response(self.settings[name], response.strip()) for name, response in zip(names, responses)}
+    
+    
     def verify_setting(self, setting_name:str) -> tuple[bool, str]:
         """Verify a single setting on the instrument
 
@@ -168,6 +473,22 @@ class SettingsManager(Instrument):
         except Exception as e:
             return False, f'Error querying setting: {e}'
         
+        return self.check_response(setting, response)
+    
+    
+    def check_response(self, setting:NumericalSetting | ModeSetting | DisplaySetting, response:str) -> tuple[bool, str]:
+        """Compares a query response to the setting's current value, the current value is updated if they differ
+
+        Args:
+            setting (NumericalSetting | ModeSetting | DisplaySetting): The setting that was queried
+            response (str): The response from the instrument
+
+        Returns:
+            tuple[bool, str]: Contains the result from the verifying of the setting
+        """
+        # Either way the instrument's value is now known
+        self.shadow.mark_synced(setting.name)
+        
         # Check to see if the value is set correctly
         if self.is_number(response) and self.compare_number_strings(setting.current_value, response):
             return True, 'Setting verified'
@@ -178,17 +499,235 @@ class SettingsManager(Instrument):
             return False, f'Setting set incorrect:{response}'
     
     
-    def set_mode(self, mode:str) -> None:
-        """Set the instrument mode
+    def attach(self) -> dict[str,tuple[bool, str]]:
+        """Syncs with an instrument that was not reset, finds its mode and reads every setting of that mode in one bulk pass
+
+        Returns:
+            dict: Verify results of the settings that were read
+        """
+        self.current_mode = self.detect_mode()
+        self.shadow.invalidate()
+        
+        names = [name for name, setting in self.settings.items() if setting.is_applicable(self.current_mode)]
+        
+        return self.verify_all_settings(names, bulk=True) # Fills current_value of every setting from the instrument
+    
+    
+    def detect_mode(self) -> str:
+        """Finds the mode of the selected measurement channel with INST:LIST? and INST?, without changing anything on the instrument.
+        Device classes whose instrument has no measurement channels override this
+
+        A channel named after a mode is that mode. Any other channel is taken for a mode of its type, its name is kept
+        in channel_names so the channel can still be selected and replaced. Instruments without channels stay in the default mode.
+
+        Returns:
+            str: The detected mode
+        """
+        if not any(self.mode_scpi.values()):
+            return self.current_mode # The config has no channel types to match
+        
+        try:
+            response = self.query_command('INST:LIST?')
+            selected_type = self.query_command('INST?').strip().strip("'\"")
+        except Exception as ex:
+            print(f'Could not list the channels, assuming {self.current_mode}:\n{ex}') # Error
+            self.clear()
+            return self.current_mode
+        
+        parts = [part.strip().strip("'\"") for part in response.strip().split(",")]
+        channels = list(zip(parts[0::2], parts[1::2])) # (channel type, channel name)
+        
+        self.open_channels = set()
+        self.channel_names = {}
+        detected = None
+        
+        # Channels named after a mode claim it first, the others take the first free mode of their type
+        for channel_type, name in sorted(channels, key=lambda channel: channel[1] not in self.modes):
+            if name in self.modes:
+                mode = name
+            else:
+                mode = next((mode for mode, mode_type in self.mode_scpi.items() if mode not in self.open_channels and self.channel_types_match(mode_type, channel_type)), None)
+            if mode is None or mode in self.open_channels:
+                continue
+            
+            self.open_channels.add(mode)
+            if name != mode:
+                self.channel_names[mode] = name
+            
+            # INST? only gives the type of the selected channel, of two channels of one type the first is taken
+            if detected is None and (len(channels) == 1 or self.channel_types_match(channel_type, selected_type)):
+                detected = mode
+        
+        return detected or self.current_mode
+    
+    
+    @staticmethod
+    def channel_types_match(first:str, second:str) -> bool:
+        """Compares two channel types, the short and the long form of a type match
+
+        Args:
+            first (str): Channel type, e.g. SAN
+            second (str): Channel type, e.g. SANALYZER
+
+        Returns:
+            bool: True if they are the same type
+        """
+        first, second = first.upper(), second.upper()
+        return bool(first and second) and (first.startswith(second) or second.startswith(first))
+    
+    
+    def channel_name(self, mode:str) -> str:
+        """Gets the name of a mode's channel on the instrument
+
+        Args:
+            mode (str): The mode
+
+        Returns:
+            str: The channel name, the mode itself unless attach found the channel under another name
+        """
+        return self.channel_names.get(mode, mode)
+    
+    
+    def set_mode(self, mode:str) -> dict[str,tuple[bool, str]]:
+        """Set the instrument mode. The settings the mode had when it was left are restored in one batch,
+        every other setting is unknown until it is read back, e.g. by one bulk verify
 
         Args:
             mode (str): Mode to be set
+
+        Returns:
+            dict: Verify results of the settings that were restored, the other settings were not touched
         """
-        command = f"INST:CRE:REPL '{self.current_mode}', {self.mode_scpi[mode]}, '{mode}'" # Command to change mode
+        if self.persistent_channels:
+            self.select_channel(mode)
+            return {} # The channel kept its settings
+        
+        with self.lock: # The acquisition thread reads current_mode and the trace under the lock, both change together here
+            self.mode_snapshots[self.current_mode] = self.known_values(self.current_mode)
+            
+            command = f"INST:CRE:REPL '{self.channel_name(self.current_mode)}', {self.mode_scpi[mode]}, '{mode}'" # Command to change mode
+            
+            self.write_command(command)
+            self.channel_names.pop(self.current_mode, None) # The new channel is named after its mode
+            
+            # The replaced channel starts from the instrument's preset, which is not necessarily the config's defaults
+            self.shadow.invalidate()
+            
+            self.current_mode = mode # update the current mode
+        
+        return self.restore_mode_snapshot(mode)
+    
+    
+    def known_values(self, mode:str) -> dict[str,str]:
+        """Gets the values of a mode's writable settings that were applied or read back
+
+        Args:
+            mode (str): The mode
+
+        Returns:
+            dict: Setting names and values
+        """
+        return {
+            name: setting.current_value for name, setting in self.settings.items()
+            if setting.setting_type != "display" and setting.is_applicable(mode) and self.shadow.state(name) != ShadowState.UNKNOWN
+        }
+    
+    
+    def restore_mode_snapshot(self, mode:str) -> dict[str,tuple[bool, str]]:
+        """Reads the mode's unknown settings in one bulk query, then writes the settings of its snapshot that differ
+        from the instrument in one batch and verifies only those
+
+        Args:
+            mode (str): The mode to restore, must be the current mode
+
+        Returns:
+            dict: Verify results of the settings that were read or restored
+        """
+        snapshot = self.mode_snapshots.get(mode, {})
+        if not snapshot:
+            return {} # Nothing to restore, the settings are read when they are shown
+        
+        # Every unknown setting of the mode is read in the same pass, so nothing is left to query afterwards
+        unknown = [name for name, setting in self.settings.items() if setting.is_applicable(mode) and self.shadow.state(name) == ShadowState.UNKNOWN]
+        read = self.verify_all_settings(unknown, bulk=True) if unknown else {}
+        
+        # The read compares with the values of the mode that was left, a setting that was read is verified either way
+        results = {name: (True, 'Setting verified') if self.shadow.state(name) != ShadowState.UNKNOWN else result for name, result in read.items()}
+        
+        changed = {name: value for name, value in snapshot.items() if not self.value_matches(name, value)}
+        if changed:
+            self.set_all_settings(changed, batched=True)
+            results.update(self.verify_all_settings(list(changed), bulk=True))
+        
+        return results
+    
+    
+    def select_channel(self, mode:str) -> None:
+        """Switches to the measurement channel of a mode, creating the channel the first time.
+        The channel that is left keeps its settings on the instrument, so its values and shadow states are kept too
+
+        Args:
+            mode (str): Mode to switch to
+        """
+        if mode == self.current_mode:
+            return
+        
+        with self.lock: # The acquisition thread reads current_mode and the trace under the lock, both change together here
+            self.open_channels.add(self.current_mode)
+            self.channel_snapshots[self.current_mode] = {
+                "values": {name: setting.current_value for name, setting in self.settings.items()},
+                "shadow": self.shadow.snapshot(),
+            }
+            
+            if mode in self.open_channels:
+                self.write_command(f"INST:SEL '{self.channel_name(mode)}'")
+                
+                snapshot = self.channel_snapshots.pop(mode, None)
+                if snapshot is None:
+                    self.shadow.invalidate() # Channel found by attach, its values were never read
+                else:
+                    for name, value in snapshot["values"].items():
+                        self.settings[name].current_value = value
+                    self.shadow.restore(snapshot["shadow"])
+            else:
+                self.write_command(f"INST:CRE {self.mode_scpi[mode]}, '{mode}'")
+                self.open_channels.add(mode)
+                self.shadow.invalidate() # A new channel starts from the instrument's defaults
+            
+            self.current_mode = mode
+    
+    
+    def sweep_and_wait(self, cancelled = None) -> int | None:
+        """Runs one sweep and waits until it is done. Continuous sweep has to be off for *OPC to wait for the sweep.
+        The lock is only held for the short *ESR? polls, so other commands, like an abort, get through during a long sweep
+
+        Args:
+            cancelled (Callable[[], bool], optional): Checked between the polls, the wait stops when it returns True
+
+        Returns:
+            int | None: Number of the sweep, counted up by one for every sweep, None if the wait was cancelled
+
+        Raises:
+            TimeoutError: The sweep was not done within twice the sweep time plus sweep_timeout_margin
+        """
+        try:
+            sweep_time = float(self.settings['Sweep Time'].current_value)
+        except (KeyError, ValueError):
+            sweep_time = 0.0
+        
+        # Reading *ESR? clears an operation complete bit left from an earlier sweep, *OPC sets it when this sweep is done
+        self.query_command('*ESR?;:INIT:IMM;*OPC')
+        deadline = time.monotonic() + (sweep_time * 2000 + self.sweep_timeout_margin) / 1000
         
-        self.write_command(command)
+        while not int(self.query_command('*ESR?')) & 1: # Bit 0 is operation complete
+            if cancelled is not None and cancelled():
+                return None
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Sweep not done after {sweep_time * 2 + self.sweep_timeout_margin / 1000:.1f} s")
+            time.sleep(self.sweep_poll_period / 1000)
         
-        self.current_mode = mode # update the current mode
+        self.sweep_count += 1
+        return self.sweep_count
     
     
     def is_number(self, string:str) -> bool:
@@ -0,0 +1,81 @@
+# shadow_state.py
+
+class ShadowState():
+    SYNCED = "synced" # current_value was read back from the instrument
+    DIRTY = "dirty" # current_value was written but has not been read back
+    UNKNOWN = "unknown" # The instrument may hold anything, e.g. after *RST or a mode change
+
+    def __init__(self):
+        """Tracks for each setting whether its current_value is known to match the instrument, settings start as UNKNOWN"""
+        self.states = {}
+        self.skipped_writes = 0 # Number of writes skipped because the instrument already had the value
+
+
+    def state(self, setting_name:str) -> str:
+        """Gets the state of a setting
+
+        Args:
+            setting_name (str): Name of the setting
+
+        Returns:
+            str: SYNCED, DIRTY or UNKNOWN
+        """
+        return self.states.get(setting_name, self.UNKNOWN)
+
+
+    def is_synced(self, setting_name:str) -> bool:
+        """Checks if the setting's current_value is known to be on the instrument
+
+        Args:
+            setting_name (str): Name of the setting
+
+        Returns:
+            bool: True if the setting is in sync
+        """
+        return self.state(setting_name) == self.SYNCED
+
+
+    def mark_synced(self, setting_name:str) -> None:
+        """Marks a setting as read back from the instrument"""
+        self.states[setting_name] = self.SYNCED
+
+
+    def mark_dirty(self, setting_name:str) -> None:
+        """Marks a setting as written but not read back"""
+        self.states[setting_name] = self.DIRTY
+
+
+    def invalidate(self, setting_names = None) -> None:
+        """Forget what is known about some settings
+
+        Args:
+            setting_names (Iterable[str], optional): Settings to invalidate. Defaults to None, which invalidates every setting.
+        """
+        if setting_names is None:
+            self.states.clear()
+            return
+        for name in setting_names:
+            self.states.pop(name, None)
+
+
+    def snapshot(self) -> dict:
+        """Copies the states, e.g. to keep them while another measurement channel is selected
+
+        Returns:
+            dict: Setting names and their states
+        """
+        return dict(self.states)
+    
+    
+    def restore(self, states:dict) -> None:
+        """Replaces the states with a snapshot
+
+        Args:
+            states (dict): Snapshot from snapshot()
+        """
+        self.states = dict(states)
+    
+    
+    def record_skip(self) -> None:
+        """Counts a write that was skipped"""
+        self.skipped_writes += 1
@@ -1,16 +1,38 @@
 # kt_cxa.py
 
 from device.base_classes.settings_manager import SettingsManager
-import json
+from device.base_classes.config_registry import get_config_registry
+import numpy as np
 
 class KtCxa(SettingsManager):
-    def __init__(self, ip_address:str):
-        with open(r"device\configs\device_types\configs.json") as file:
-            config = json.load(file)
-        
+    binary_trace = True # Transfer traces as REAL,32 binary blocks, set to False to fall back to ASCII
+    binary_format_command = 'FORM REAL,32;:FORM:BORD SWAP' # The CXA defaults to big endian blocks
+    
+    def __init__(self, ip_address:str, transport:str = "VXI-11", session = None, idn:str = None, attach:bool = False, persistent_channels:bool = False):
         self.device_type = "Keysight Technologies CXA N9000B"
         
-        super().__init__(ip_address, config[self.device_type])
+        super().__init__(ip_address, get_config_registry().device_type_filepath(self.device_type), transport, session, idn, attach, persistent_channels)
+    
+    
+    def detect_mode(self) -> str:
+        """Finds the mode from the selected application with INST:SEL?, the CXA has no measurement channels to list.
+        Spectrum and Zero-Span are the same application, a span of 0 Hz is Zero-Span
+
+        Returns:
+            str: The detected mode
+        """
+        try:
+            application = self.query_command('INST:SEL?').strip().strip("'\"").upper()
+            if application not in ('SA', 'SANALYZER'):
+                return self.current_mode
+            span = float(self.query_command(self.settings['Frequency Span'].get_query_scpi_command()))
+        except Exception as ex:
+            print(f'Could not detect the mode, assuming {self.current_mode}:\n{ex}') # Error
+            return self.current_mode
+        
+        if span == 0 and 'Zero-Span' in self.modes:
+            return 'Zero-Span'
+        return 'Spectrum' if 'Spectrum' in self.modes else self.current_mode
     
     
     def abort(self) -> None:
@@ -25,10 +47,10 @@ class KtCxa(SettingsManager):
         self.write_command("INIT:IMM;*WAI")
     
     
-    def get_trace(self) -> list:
+    def get_trace(self) -> np.ndarray:
         """Gets the current trace from the instrument
 
         Returns:
-            list: list of floats of the trace values
+            np.ndarray: float32 array of the trace values
         """
-        return self.instrument.query_ascii_values('FORM ASC;:TRAC:DATA? TRACE1')
\ No newline at end of file
+        return self.query_trace('TRACE1', self.binary_trace)
\ No newline at end of file
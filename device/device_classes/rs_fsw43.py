@@ -1,17 +1,17 @@
 # rs_fsw.py
 
 from device.base_classes.settings_manager import SettingsManager
-import json
+from device.base_classes.config_registry import get_config_registry
+import numpy as np
 
 class RsFsw43(SettingsManager):
-    def __init__(self, ip_address:str):
-        
-        with open(r"device\configs\device_types\configs.json") as file:
-            config = json.load(file)
+    binary_trace = True # Transfer traces as REAL,32 binary blocks, set to False to fall back to ASCII
+    
+    def __init__(self, ip_address:str, transport:str = "VXI-11", session = None, idn:str = None, attach:bool = False, persistent_channels:bool = False):
         
         self.device_type = "Rhode & Schwarz FSW-43"
         
-        super().__init__(ip_address, config[self.device_type])
+        super().__init__(ip_address, get_config_registry().device_type_filepath(self.device_type), transport, session, idn, attach, persistent_channels)
     
     
     
@@ -27,13 +27,13 @@ class RsFsw43(SettingsManager):
         self.write_command("INIT:IMM;*WAI")
     
     
-    def get_trace(self) -> list:
+    def get_trace(self) -> np.ndarray:
         """Gets the current trace from the instrument
 
         Returns:
-            list: list of floats of the trace values
+            np.ndarray: float32 array of the trace values
         """
-        return self.instrument.query_ascii_values('FORM ASC;:TRAC:DATA? TRACE1')
+        return self.query_trace('TRACE1', self.binary_trace)
     
     
     def save_spectrogram(self) -> None:
@@ -63,21 +63,22 @@ class RsFsw43(SettingsManager):
         Returns:
             bool: Copied sucessfully
         """
-        original_timeout = self.instrument.timeout
-        
-        self.instrument.timeout = 10000
-        
-        try:
-            self.instrument.write(r"MMEM:DATA? 'C:\Users\Instrument\Documents\lab_automation\test.CSV'")
-            data = self.instrument.read_raw()  # Read binary data
-            
-            # Save to local file
-            with open(filename, 'wb') as f:
-                f.write(data)
+        with self.lock:
+            original_timeout = self.instrument.timeout
             
-            self.instrument.timeout = original_timeout
+            self.instrument.timeout = 10000
             
-            return True
-        except:
-            self.instrument.timeout = original_timeout
-            return False
\ No newline at end of file
+            try:
+                self.instrument.write(r"MMEM:DATA? 'C:\Users\Instrument\Documents\lab_automation\test.CSV'")
+                data = self.instrument.read_raw()  # Read binary data
+                
+                # Save to local file
+                with open(filename, 'wb') as f:
+                    f.write(data)
+                
+                self.instrument.timeout = original_timeout
+                
+                return True
+            except:
+                self.instrument.timeout = original_timeout
+                return False
\ No newline at end of file
@@ -0,0 +1,408 @@
+# scpi_simulator.py
+
+from pathlib import Path
+import json
+import random
+import socketserver
+import threading
+import time
+
+import numpy as np
+
+
+def split_outside_quotes(string:str, separator:str) -> list[str]:
+    """Splits a string on a separator, ignoring separators inside quotes
+
+    Args:
+        string (str): String to split
+        separator (str): Single character to split on
+
+    Returns:
+        list[str]: The parts of the string
+    """
+    parts = []
+    current = []
+    quote = None
+    for char in string:
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "'\"":
+            quote = char
+        elif char == separator:
+            parts.append("".join(current))
+            current = []
+            continue
+        current.append(char)
+    parts.append("".join(current))
+    return parts
+
+
+def to_ieee_block(data:bytes) -> bytes:
+    """Wraps bytes in a definite length IEEE 488.2 block
+
+    Args:
+        data (bytes): Payload
+
+    Returns:
+        bytes: The block, '#<digits><length><data>'
+    """
+    length = str(len(data))
+    return f"#{len(length)}{length}".encode() + data
+
+
+class SimulatedInstrument():
+    def __init__(self, config:dict, seed:int = None):
+        """A spectrum analyzer that answers the SCPI commands of a device settings config
+
+        Args:
+            config (dict): Contents of one of the device/configs/settings/*.json files
+            seed (int, optional): Seed for the synthetic trace noise. Defaults to None.
+        """
+        self.config = config
+        self.idn = f"{config['IDN']},SIM000000,0.0.0"
+        self.lock = threading.Lock() # Connections share one instrument
+        self.rng = np.random.default_rng(seed)
+
+        self.write_headers = {} # Numerical write header: setting name
+        self.write_commands = {} # Full mode write command: (setting name, value)
+        self.queries = {} # Query command: setting name
+
+        for name, setting in config["Settings"].items():
+            if "query_command" in setting:
+                self.queries[self.normalize(setting["query_command"])] = name
+            if setting["setting_type"] == "numerical":
+                self.write_headers[self.normalize(setting["write_command"])] = name
+            elif setting["setting_type"] == "mode":
+                for value, commands in setting["write_commands"].items():
+                    for command in commands.split(";"):
+                        self.write_commands[self.normalize(command)] = (name, value)
+
+        self.reset()
+
+
+    def reset(self) -> None:
+        """Puts the instrument back to its defaults, like *RST"""
+        default_mode = self.config["Default Mode"]
+        self.channels = {default_mode: self.config["Modes SCPI Commands"].get(default_mode, "")} # Channel name: channel type
+        self.channel_values = {default_mode: self.default_values()} # Channel name: setting values, every channel has its own
+        self.selected_channel = default_mode
+
+        self.binary = False
+        self.big_endian = False
+        self.errors = []
+        self.sweep_count = 0
+        self.sweep_done_at = 0.0
+        self.opc_pending = False # *OPC was sent and operation complete has not been read yet
+        self.trace_cache = (None, None) # (sweep, trace), a trace is only read again until the next sweep
+
+
+    @property
+    def values(self) -> dict:
+        """Setting values of the selected channel"""
+        return self.channel_values[self.selected_channel]
+
+
+    def default_values(self) -> dict:
+        """Setting values of a new channel
+
+        Returns:
+            dict: Setting names and their default values
+        """
+        return {name: setting["default_value"] for name, setting in self.config["Settings"].items()}
+
+
+    def normalize(self, command:str) -> str:
+        """Normalizes a command so it can be looked up
+
+        Args:
+            command (str): SCPI command
+
+        Returns:
+            str: Upper case command without a leading ':' and with single spaces
+        """
+        return " ".join(command.strip().lstrip(":").upper().split())
+
+
+    def handle_message(self, message:str) -> bytes | None:
+        """Runs every command in a compound message
+
+        Args:
+            message (str): Message as received, without the termination
+
+        Returns:
+            bytes | None: The response with its termination, None if there were no queries
+        """
+        responses = []
+        with self.lock:
+            for command in split_outside_quotes(message, ";"):
+                if not command.strip():
+                    continue
+                errors = len(self.errors)
+                response = self.handle_command(command)
+                if response is not None:
+                    responses.append(response)
+                if len(self.errors) > errors:
+                    break # Like a real parser, the rest of the message is dropped after a rejected command
+
+        if not responses:
+            return None
+
+        # A binary block is the only thing in a response that is not text
+        return b";".join(response if isinstance(response, bytes) else response.encode() for response in responses) + b"\n"
+
+
+    def handle_command(self, command:str) -> str | bytes | None:
+        """Runs a single command
+
+        Args:
+            command (str): SCPI command
+
+        Returns:
+            str | bytes | None: Response of a query, None for a write
+        """
+        normalized = self.normalize(command)
+        header, _, arguments = normalized.partition(" ")
+        arguments = [argument.strip() for argument in split_outside_quotes(command.strip().partition(" ")[2], ",")] if arguments else []
+
+        if header == "*IDN?":
+            return self.idn
+        if header == "*RST":
+            self.reset()
+            return None
+        if header == "*OPC?":
+            # Blocks until a running sweep is done, like the real thing
+            remaining = self.sweep_done_at - time.monotonic()
+            if remaining > 0:
+                time.sleep(remaining)
+            return "1"
+        if header == "*OPC":
+            self.opc_pending = True
+            return None
+        if header == "*ESR?":
+            # Only the operation complete bit, set once the sweep running at *OPC is done. Reading clears it
+            complete = self.opc_pending and time.monotonic() >= self.sweep_done_at
+            if complete:
+                self.opc_pending = False
+            return str(int(complete))
+        if header == "ABOR":
+            self.sweep_done_at = 0.0
+            return None
+        if header == "*CLS":
+            self.opc_pending = False
+            return None
+        if header == "*WAI":
+            return None
+        if header in ("SYST:ERR?", "SYST:ERR:NEXT?"):
+            return self.errors.pop(0) if self.errors else '0,"No error"'
+
+        if header in ("INIT", "INIT:IMM", "INIT1", "INIT1:IMM"):
+            self.sweep_count += 1
+            self.sweep_done_at = time.monotonic() + self.sweep_time()
+            return None
+
+        if header.startswith("INST"):
+            return self.handle_channel_command(header, arguments)
+
+        if header == "FORM" or header == "FORM:DATA":
+            self.binary = arguments[0].upper().startswith("REAL")
+            return None
+        if header == "FORM:BORD":
+            self.big_endian = arguments[0].upper().startswith("NORM")
+            return None
+        if header.startswith("TRAC") and header.endswith("?"):
+            return self.trace_response()
+
+        if header in self.queries:
+            return self.values[self.queries[header]]
+        if header in self.write_headers and arguments:
+            self.values[self.write_headers[header]] = arguments[0]
+            return None
+        if normalized in self.write_commands:
+            name, value = self.write_commands[normalized]
+            self.values[name] = value
+            return None
+
+        self.errors.append(f'-113,"Undefined header;{command.strip()}"')
+        return "" if header.endswith("?") else None
+
+
+    def handle_channel_command(self, header:str, arguments:list[str]) -> str | None:
+        """Handles the INSTrument channel commands
+
+        Args:
+            header (str): Normalized command header
+            arguments (list[str]): Command arguments
+
+        Returns:
+            str | None: Response of a query, None for a write
+        """
+        names = [argument.strip("'\"") for argument in arguments]
+
+        if header == "INST:CRE:REPL":
+            old_name, channel_type, new_name = names
+            self.channels = {(new_name if name == old_name else name): (channel_type if name == old_name else kind) for name, kind in self.channels.items()}
+            self.channel_values.pop(old_name, None)
+            self.channel_values[new_name] = self.default_values() # A replaced channel starts from the defaults
+            self.selected_channel = new_name
+        elif header == "INST:CRE":
+            channel_type, new_name = names
+            self.channels[new_name] = channel_type
+            self.channel_values[new_name] = self.default_values()
+            self.selected_channel = new_name
+        elif header in ("INST:SEL", "INST"):
+            if names and names[0] in self.channels:
+                self.selected_channel = names[0]
+        elif header == "INST:REN":
+            old_name, new_name = names
+            self.channels = {(new_name if name == old_name else name): kind for name, kind in self.channels.items()}
+            self.channel_values[new_name] = self.channel_values.pop(old_name)
+            if self.selected_channel == old_name:
+                self.selected_channel = new_name
+        elif header == "INST:DEL":
+            if names[0] != self.selected_channel and len(self.channels) > 1:
+                self.channels.pop(names[0], None)
+                self.channel_values.pop(names[0], None)
+        elif header == "INST:LIST?":
+            return ",".join(f"'{kind}','{name}'" for name, kind in self.channels.items())
+        elif header in ("INST?", "INST:SEL?"):
+            return self.channels.get(self.selected_channel, "")
+        return None
+
+
+    def sweep_time(self) -> float:
+        """The current sweep time in seconds"""
+        try:
+            return float(self.values.get("Sweep Time", 0))
+        except ValueError:
+            return 0.0
+
+
+    def number_of_points(self) -> int:
+        """The current number of trace points"""
+        try:
+            return int(float(self.values.get("Number of Points", 1001)))
+        except ValueError:
+            return 1001
+
+
+    def synthetic_trace(self) -> np.ndarray:
+        """Noise floor with a few carriers
+
+        Returns:
+            np.ndarray: float32 trace in dBm
+        """
+        points = self.number_of_points()
+        trace = self.rng.normal(-90, 1.5, points).astype(np.float32)
+
+        position = np.linspace(0, 1, points, dtype=np.float32)
+        for center, level, width in ((0.25, -20, 0.002), (0.5, -35, 0.01), (0.8, -50, 0.001)):
+            carrier = level - 90 * ((position - center) / width) ** 2 # Parabola in dB is a gaussian in power
+            np.maximum(trace, carrier, out=trace)
+        return trace
+
+
+    def current_sweep(self) -> tuple:
+        """Identifies the sweep the trace comes from
+
+        Returns:
+            tuple: The channel, number of points and sweep. Continuous sweeps count up with the sweep time, single sweeps with INIT
+        """
+        if self.values.get("Sweep", "1") == "1":
+            sweep = ("continuous", int(time.monotonic() / max(self.sweep_time(), 0.001)))
+        else:
+            sweep = ("single", self.sweep_count)
+        return (self.selected_channel, self.number_of_points(), sweep)
+
+
+    def trace_response(self) -> str | bytes:
+        """Trace data in the current format
+
+        Returns:
+            str | bytes: Comma separated values, or an IEEE block of REAL,32 values
+        """
+        sweep = self.current_sweep()
+        if self.trace_cache[0] != sweep:
+            self.trace_cache = (sweep, self.synthetic_trace())
+        trace = self.trace_cache[1]
+        if self.binary:
+            return to_ieee_block(trace.astype(">f4" if self.big_endian else "<f4").tobytes())
+        return ",".join(f"{value:.2f}" for value in trace)
+
+
+class ScpiRequestHandler(socketserver.StreamRequestHandler):
+    disable_nagle_algorithm = True # Small responses go out at once, like a real instrument
+
+    def handle(self) -> None:
+        """Reads newline terminated messages and writes back the responses"""
+        server = self.server
+        for line in self.rfile:
+            message = line.decode(errors="replace").strip()
+            if not message:
+                continue
+
+            # Fake network and instrument processing time
+            delay = server.latency + random.uniform(0, server.jitter)
+            if delay > 0:
+                time.sleep(delay)
+
+            response = server.instrument.handle_message(message)
+            if response is not None:
+                self.wfile.write(response)
+                self.wfile.flush()
+
+
+class ScpiSimulatorServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, instrument:SimulatedInstrument, host:str = "127.0.0.1", port:int = 5025, latency:float = 0.0, jitter:float = 0.0):
+        """Raw socket SCPI server, the same transport as TCPIP::host::port::SOCKET
+
+        Args:
+            instrument (SimulatedInstrument): The instrument that answers the commands
+            host (str, optional): Address to listen on. Defaults to "127.0.0.1".
+            port (int, optional): Port to listen on, 0 picks a free port. Defaults to 5025.
+            latency (float, optional): Delay added to every message in seconds. Defaults to 0.0.
+            jitter (float, optional): Extra random delay of up to this many seconds. Defaults to 0.0.
+        """
+        self.instrument = instrument
+        self.latency = latency
+        self.jitter = jitter
+        super().__init__((host, port), ScpiRequestHandler)
+
+
+    @property
+    def port(self) -> int:
+        """The port the server is listening on"""
+        return self.server_address[1]
+
+
+    @property
+    def resource_name(self) -> str:
+        """VISA resource string to connect to this server"""
+        return f"TCPIP::{self.server_address[0]}::{self.port}::SOCKET"
+
+
+    def start(self) -> threading.Thread:
+        """Serves on a background thread
+
+        Returns:
+            threading.Thread: The server thread
+        """
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+def load_settings_config(config_filepath:str | Path) -> dict:
+    """Loads a device settings config
+
+    Args:
+        config_filepath (str | Path): Path to one of the device/configs/settings/*.json files
+
+    Returns:
+        dict: The config
+    """
+    with open(config_filepath, "r") as file:
+        return json.load(file)
@@ -16,7 +16,7 @@ from PySide6.QtWidgets import (
 )
 import json
 from pathlib import Path
-from pyvisa import ResourceManager
+from device.base_classes.session import open_session
 import ast
 
 from device_wizard.widgets import DictEdit, SettingEdit, SettingEditCombo, toggleList
@@ -138,11 +138,9 @@ class CreateDialog(QDialog):
     
     def query_idn(self):
         """Query the IDN from the instrument and puts it in the text edit"""
-        rm = ResourceManager("@py")
         try:
-            instr = rm.open_resource(f"TCPIP::{self.ip_entry.text()}::INSTR")
-            
-            idn = instr.query('*IDN?')
+            session, idn = open_session(self.ip_entry.text()) # Uses the app's shared ResourceManager
+            session.close()
             self.idn_entry.setText(idn)
         except Exception as ex:
             print(f'Error querying the instrument session:\n{ex.args[0]}') # Error
@@ -2,7 +2,6 @@
 
 from PySide6.QtWidgets import QApplication, QDialog
 
-from ui.common_gui.main_window import MainWindow
 from ui.common_gui.connect_dialog import IpEntryDialog
 from pathlib import Path
 import sys
@@ -27,6 +26,8 @@ def main():
         
         config = ip_dialog.config # Gets the config out from the IP dialog
         
+        from ui.common_gui.main_window import MainWindow # Imported after the dialog so it shows up sooner
+        
         # Creates the main window
         window = MainWindow(config)
         window.show()
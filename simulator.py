@@ -0,0 +1,28 @@
+# simulator.py
+
+from device.simulator.scpi_simulator import SimulatedInstrument, ScpiSimulatorServer, load_settings_config
+from pathlib import Path
+import argparse
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated SCPI instrument on a raw socket")
+    parser.add_argument("--config", default=str(Path("device") / "configs" / "settings" / "fsw_settings.json"), help="Device settings config to simulate")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=5025, help="Port to listen on")
+    parser.add_argument("--latency", type=float, default=0.0, help="Delay added to every message in milliseconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra random delay of up to this many milliseconds")
+    args = parser.parse_args()
+    
+    instrument = SimulatedInstrument(load_settings_config(args.config))
+    server = ScpiSimulatorServer(instrument, args.host, args.port, args.latency / 1000, args.jitter / 1000)
+    
+    print(f"Simulating {instrument.idn} on {server.resource_name}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,462 @@
+# acquisition.py
+
+from PySide6.QtCore import QCoreApplication, QMetaObject, QObject, QThread, QTimer, Qt, Signal, Slot
+from ui.common_gui.acquisition_stats import AcquisitionStats
+from ui.common_gui.trace_buffer import TraceRingBuffer
+
+import threading
+import time
+
+import numpy as np
+
+
+class TraceAcquisitionWorker(QObject):
+    """
+    Fetches traces from the instrument on a worker thread so a slow sweep or a
+    VISA timeout never blocks the Qt event loop.
+
+    Only the newest trace is kept. If the GUI has not taken the previous trace
+    by the time a new one arrives, the old one is dropped instead of queued.
+
+    Polling reads a trace every update period. In sweep synchronized mode every
+    read starts a single sweep and polls *ESR? until it is done, so each sweep is
+    read exactly once. Every trace is tagged with a sweep number, traces that repeat
+    the previous sweep and sweeps that were never read are counted.
+    """
+    frame_ready = Signal() # Emitted when a new trace is waiting in the slot
+    error_occurred = Signal(str)
+
+    max_back_off = 5000 # Longest wait in milliseconds between reads that keep failing
+
+
+    def __init__(self, device, update_period: int, history_depth: int, stats: AcquisitionStats):
+        super().__init__()
+        self.device = device
+        self.stats = stats
+        self.update_period = update_period
+        self.timer = None
+        self.active_modes = frozenset() # Modes with a visible view, replaced as a whole from the GUI thread
+
+        self.history_depth = history_depth
+        self.histories = {} # Mode: TraceRingBuffer of the latest traces read in that mode
+
+        self._lock = threading.Lock()
+        self._latest = None # Newest trace that the GUI has not taken yet
+        self._pending = False # True while a frame_ready signal is waiting in the GUI's event queue
+        self.dropped_frames = 0
+
+        self.sweep_synced = False
+        self.wait_cancelled = threading.Event() # Set from the GUI thread to stop waiting for a sweep
+        self.failures = 0 # Failed reads in a row
+        self._last_sweeps = {} # Mode: (sweep number, trace, time it was read)
+        self.duplicate_traces = 0 # Reads that returned the previous sweep again
+        self.dropped_sweeps = 0 # Sweeps that were never read, estimated from the sweep time while polling
+
+
+    @Slot()
+    def start(self) -> None:
+        """Starts polling, runs on the worker thread so the timer lives there"""
+        if self.timer is None:
+            self.timer = QTimer(self)
+            self.timer.timeout.connect(self.acquire)
+        self.wait_cancelled.clear()
+        self.timer.start(0 if self.sweep_synced else self.update_period) # Synchronized reads are paced by the sweeps
+
+
+    @Slot()
+    def stop(self) -> None:
+        """Stops polling"""
+        if self.timer is not None:
+            self.timer.stop()
+
+
+    @Slot(bool)
+    def set_sweep_synced(self, enabled: bool) -> None:
+        """Switches between polling and sweep synchronized reads. The service changes the sweep setting on the GUI thread
+
+        Args:
+            enabled (bool): True to read once per single sweep
+        """
+        self.sweep_synced = enabled
+        self._last_sweeps = {}
+        if enabled:
+            self.wait_cancelled.clear()
+        if self.timer is None or not self.timer.isActive():
+            return
+
+        self.timer.setInterval(0 if enabled else self.update_period)
+
+
+    @Slot(int)
+    def set_update_period(self, period: int) -> None:
+        """Changes the polling period
+
+        Args:
+            period (int): Period in milliseconds
+        """
+        self.update_period = period
+        if self.timer is not None and not self.sweep_synced:
+            self.timer.setInterval(period)
+
+
+    @Slot()
+    def acquire(self) -> None:
+        """Fetch one trace for the current mode and hand it to the GUI"""
+        mode = self.device.current_mode
+        if mode not in self.active_modes:
+            self._schedule(False)
+            return # No visible view of the current mode, leave the session alone
+
+        try:
+            sweep = None
+            if self.sweep_synced:
+                start = time.perf_counter()
+                sweep = self.device.sweep_and_wait(self._sweep_wait_cancelled)
+                if sweep is None:
+                    self._schedule(False)
+                    return
+                self.stats.record("sweep", time.perf_counter() - start)
+            with self.device.lock: # current_mode only changes under the lock, so the trace is read in the mode it is tagged with
+                if self.device.current_mode != mode:
+                    self._schedule(False)
+                    return # The mode changed since it was checked, e.g. while waiting for the sweep
+                start = time.perf_counter()
+                trace = self.device.get_trace()
+                parse_time = self.device.trace_parse_time
+        except Exception as e:
+            self.error_occurred.emit(f"Error reading trace: {e}")
+            self.failures += 1
+            self._schedule(False)
+            return
+
+        self.failures = 0
+        self._schedule(True)
+
+        read = time.perf_counter()
+        self.stats.record("fetch", read - start - parse_time)
+
+        sweep = self._tag_sweep(mode, sweep, trace)
+        if sweep is None:
+            return # Same sweep as the previous read
+
+        self.history(mode).append(trace) # Sized by the first trace, so it follows Number of Points
+
+        self.stats.record("parse", parse_time + time.perf_counter() - read) # Conversion, duplicate check and history copy
+        self.stats.count_trace()
+
+        with self._lock:
+            if self._pending:
+                self.dropped_frames += 1 # The GUI never took the previous trace
+            self._latest = (mode, sweep, trace)
+            notify = not self._pending
+            self._pending = True
+
+        # Only one signal is ever queued, the GUI always collects the newest trace
+        if notify:
+            self.frame_ready.emit()
+
+
+    def _sweep_wait_cancelled(self) -> bool:
+        """Checked between the polls of a sweep, stops waiting once the sweep is not wanted anymore"""
+        return self.wait_cancelled.is_set() or self.device.current_mode not in self.active_modes
+
+
+    def _schedule(self, read: bool) -> None:
+        """Sets the wait before the next read. Sweep synchronized reads follow each other at once, after a
+        failed read or when there was nothing to read the worker waits, so the timer never spins
+
+        Args:
+            read (bool): True if the last call read a trace
+        """
+        if self.timer is None:
+            return
+        if read:
+            interval = 0 if self.sweep_synced else self.update_period
+        else:
+            interval = min(self.update_period * 2 ** self.failures, self.max_back_off) # Doubled for every failure in a row
+        if self.timer.interval() != interval:
+            self.timer.setInterval(interval)
+
+
+    def _tag_sweep(self, mode: str, sweep: int | None, trace: np.ndarray) -> int | None:
+        """Numbers a trace by its sweep and counts repeated and missed sweeps. Only polled traces can repeat a sweep,
+        a synchronized trace always comes from a new sweep even if it equals the previous one, e.g. a static signal
+
+        Args:
+            mode (str): Mode the trace was read in
+            sweep (int | None): Sweep number from sweep_and_wait, None while polling
+            trace (np.ndarray): The trace
+
+        Returns:
+            int | None: Sweep number of the trace, None if it repeats the previous sweep
+        """
+        now = time.monotonic()
+        last = self._last_sweeps.get(mode)
+
+        if sweep is None:
+            if last is not None and np.array_equal(last[1], trace):
+                self.duplicate_traces += 1 # Read again before the instrument finished a new sweep
+                return None
+
+            sweep = last[0] + 1 if last is not None else 1
+            if last is not None:
+                # Polling cannot see the sweeps between two reads, estimate them from the sweep time
+                try:
+                    sweep_time = float(self.device.settings['Sweep Time'].current_value)
+                except (KeyError, ValueError):
+                    sweep_time = 0.0
+                if sweep_time > 0:
+                    missed = int((now - last[2]) / sweep_time) - 1
+                    if missed > 0:
+                        self.dropped_sweeps += missed
+                        sweep += missed
+        elif last is not None and sweep > last[0] + 1:
+            self.dropped_sweeps += sweep - last[0] - 1 # Sweeps run by something else in between
+
+        self._last_sweeps[mode] = (sweep, trace, now)
+        return sweep
+
+
+    def history(self, mode: str) -> TraceRingBuffer:
+        """Gets the trace history of a mode, creating an empty one if no trace was read in that mode yet
+
+        Args:
+            mode (str): The mode
+
+        Returns:
+            TraceRingBuffer: The latest traces of the mode
+        """
+        with self._lock:
+            if mode not in self.histories:
+                self.histories[mode] = TraceRingBuffer(self.history_depth)
+            return self.histories[mode]
+
+
+    def take_frame(self):
+        """Takes the newest trace, called from the GUI thread
+
+        Returns:
+            tuple[str, int, np.ndarray] | None: The mode the trace was read in, its sweep number and the trace, or None if there is nothing new
+        """
+        with self._lock:
+            frame, self._latest = self._latest, None
+            self._pending = False
+        return frame
+
+
+class AcquisitionService(QObject):
+    """
+    One trace acquisition thread per instrument, shared by every view.
+
+    Views subscribe with a mode. The instrument is only polled while a visible
+    view of the instrument's current mode wants traces, and each trace is only
+    handed to the views of the mode it was read in.
+    """
+    error_occurred = Signal(str)
+
+    _start_requested = Signal()
+    _stop_requested = Signal()
+    _period_requested = Signal(int)
+    _sweep_sync_requested = Signal(bool)
+
+    _services = {} # One service per SettingsManager
+    default_update_period = 100
+    default_history_depth = 50 # Traces kept per mode, 2 x 50 x 100001 points of float32 is 40 MB
+
+
+    @classmethod
+    def for_device(cls, device) -> "AcquisitionService":
+        """Returns the acquisition service of a device, creating it on first use
+
+        Args:
+            device (SettingsManager): The instrument
+
+        Returns:
+            AcquisitionService: The shared service for this instrument
+        """
+        if device not in cls._services:
+            cls._services[device] = cls(device)
+        return cls._services[device]
+
+
+    def __init__(self, device, parent=None):
+        super().__init__(parent)
+
+        self.device = device
+        self.subscribers = {} # view: True if the view is visible and wants traces
+        self.running = False
+        self.sweep_synced = False
+        self._restore_sweep = None # Sweep setting to put back when sweep synchronized mode ends
+        self.last_sweep = 0 # Sweep number of the last trace handed to the views
+        self.stats = AcquisitionStats() # Timings of the trace pipeline, views add their render and log times
+
+        self.worker_thread = QThread()
+        self.worker = TraceAcquisitionWorker(device, self.default_update_period, self.default_history_depth, self.stats)
+        self.worker.moveToThread(self.worker_thread)
+
+        # Signals across the threads are queued, so the worker slots always run on the worker thread
+        self._start_requested.connect(self.worker.start)
+        self._stop_requested.connect(self.worker.stop)
+        self._period_requested.connect(self.worker.set_update_period)
+        self._sweep_sync_requested.connect(self.worker.set_sweep_synced)
+        self.worker.frame_ready.connect(self._on_frame_ready)
+        self.worker.error_occurred.connect(self.error_occurred)
+
+        self.worker_thread.start()
+
+        QCoreApplication.instance().aboutToQuit.connect(self.shutdown)
+
+
+    @property
+    def dropped_frames(self) -> int:
+        """Number of traces that were replaced before the GUI took them"""
+        return self.worker.dropped_frames
+
+
+    @property
+    def duplicate_traces(self) -> int:
+        """Number of reads that returned the previous sweep again"""
+        return self.worker.duplicate_traces
+
+
+    @property
+    def dropped_sweeps(self) -> int:
+        """Number of sweeps that were never read"""
+        return self.worker.dropped_sweeps
+
+
+    def set_sweep_synced(self, enabled: bool) -> None:
+        """Read once per finished sweep instead of polling"""
+        self.sweep_synced = enabled
+        if enabled:
+            if self.running:
+                self._enter_sweep_sync() # Single sweep before the worker starts waiting for one
+        else:
+            self.worker.wait_cancelled.set() # A sweep being waited for is abandoned before the slot runs
+            self._leave_sweep_sync()
+        self._sweep_sync_requested.emit(enabled)
+
+
+    def _enter_sweep_sync(self) -> None:
+        """Turns continuous sweep off, *OPC only signals the end of a single sweep. Runs on the GUI thread like every
+        other setting change, the worker only reads"""
+        setting = self.device.settings.get('Sweep')
+        if setting is None or self._restore_sweep is not None:
+            return
+        try:
+            if setting.current_value != '0':
+                self._restore_sweep = setting.current_value
+                self.device.set_setting('Sweep', '0')
+        except Exception as e:
+            self.error_occurred.emit(f"Error turning continuous sweep off: {e}")
+
+
+    def _leave_sweep_sync(self) -> None:
+        """Puts back the sweep setting that was changed by _enter_sweep_sync"""
+        if self._restore_sweep is None:
+            return
+        try:
+            self.device.set_setting('Sweep', self._restore_sweep)
+        except Exception as e:
+            self.error_occurred.emit(f"Error restoring the sweep: {e}")
+        self._restore_sweep = None
+
+
+    def history(self, mode: str) -> TraceRingBuffer:
+        """Gets the latest traces read in a mode, e.g. for averaging or a waterfall
+
+        Args:
+            mode (str): The mode
+
+        Returns:
+            TraceRingBuffer: The trace history of the mode
+        """
+        return self.worker.history(mode)
+
+
+    def set_history_depth(self, depth: int) -> None:
+        """Changes the number of traces kept per mode, which drops the current history
+
+        Args:
+            depth (int): Number of traces
+        """
+        self.worker.history_depth = depth
+        for history in list(self.worker.histories.values()):
+            history.resize(history.points, depth)
+
+
+    def subscribe(self, view) -> None:
+        """Registers a view, the view needs a mode attribute and an update_plot(trace) method
+
+        Args:
+            view (QWidget): The view that wants traces
+        """
+        self.subscribers[view] = False
+        self._update_polling()
+
+
+    def unsubscribe(self, view) -> None:
+        """Removes a view
+
+        Args:
+            view (QWidget): The view to remove
+        """
+        self.subscribers.pop(view, None)
+        self._update_polling()
+
+
+    def set_view_active(self, view, active: bool) -> None:
+        """Tells the service whether a view currently needs traces
+
+        Args:
+            view (QWidget): The subscribed view
+            active (bool): True if the view is visible and updating
+        """
+        if view in self.subscribers:
+            self.subscribers[view] = active
+            self._update_polling()
+
+
+    def set_update_period(self, period: int) -> None:
+        """Set the polling period in milliseconds"""
+        self._period_requested.emit(period)
+
+
+    def shutdown(self) -> None:
+        """Stops polling and waits for the worker thread to finish"""
+        self.worker.wait_cancelled.set()
+        if self.worker_thread.isRunning():
+            # Blocks until stop ran on the worker thread, so the timer is stopped there before the thread ends
+            QMetaObject.invokeMethod(self.worker, "stop", Qt.BlockingQueuedConnection)
+        self._leave_sweep_sync()
+        self.running = False
+        self.worker_thread.quit()
+        self.worker_thread.wait()
+
+
+    def _update_polling(self) -> None:
+        """Starts the worker if any view needs data and pauses it otherwise"""
+        active_modes = frozenset(view.mode for view, active in self.subscribers.items() if active)
+        self.worker.active_modes = active_modes
+
+        if active_modes and not self.running:
+            if self.sweep_synced:
+                self._enter_sweep_sync()
+            self._start_requested.emit()
+            self.running = True
+        elif not active_modes and self.running:
+            self._stop_requested.emit()
+            self._leave_sweep_sync()
+            self.running = False
+
+
+    @Slot()
+    def _on_frame_ready(self) -> None:
+        frame = self.worker.take_frame()
+        if frame is None:
+            return
+
+        mode, self.last_sweep, trace = frame
+        for view, active in list(self.subscribers.items()):
+            if active and view.mode == mode:
+                view.update_plot(trace)
@@ -0,0 +1,95 @@
+# acquisition_stats.py
+
+from collections import deque
+import threading
+import time
+
+
+class AcquisitionStats():
+    stages = ("sweep", "fetch", "parse", "render", "log")
+    window = 2.0 # Seconds the rates and mean times are taken over
+
+    def __init__(self):
+        """Rolling timings of the trace pipeline, from the sweep to the CSV file, and the achieved trace rate
+
+        The acquisition thread records sweep, fetch and parse, the views record render and log.
+        """
+        self.lock = threading.Lock() # Recorded from the acquisition thread and the GUI thread
+        self.reset()
+
+
+    def reset(self) -> None:
+        """Forgets everything recorded so far"""
+        with self.lock:
+            self.samples = {stage: deque() for stage in self.stages} # Stage: (time recorded, seconds)
+            self.traces = deque() # Times new traces were read
+
+
+    def _trim(self, samples:deque, now:float) -> None:
+        """Drops the samples older than the window"""
+        while samples and samples[0][0] < now - self.window:
+            samples.popleft()
+
+
+    def record(self, stage:str, seconds:float) -> None:
+        """Records the time one trace spent in a stage
+
+        Args:
+            stage (str): One of the stages
+            seconds (float): Time spent
+        """
+        now = time.monotonic()
+        with self.lock:
+            samples = self.samples[stage]
+            samples.append((now, seconds))
+            self._trim(samples, now)
+
+
+    def count_trace(self) -> None:
+        """Records that a new trace was read"""
+        now = time.monotonic()
+        with self.lock:
+            self.traces.append((now, None))
+            self._trim(self.traces, now)
+
+
+    def summary(self) -> dict:
+        """Gets the trace rate and the mean time and rate of every stage over the window
+
+        Returns:
+            dict: traces_per_second, and mean_ms and per_second for every stage
+        """
+        now = time.monotonic()
+        summary = {}
+        with self.lock:
+            self._trim(self.traces, now)
+            summary["traces_per_second"] = len(self.traces) / self.window
+            for stage, samples in self.samples.items():
+                self._trim(samples, now)
+                summary[stage] = {
+                    "mean_ms": sum(seconds for _, seconds in samples) * 1000 / len(samples) if samples else 0.0,
+                    "per_second": len(samples) / self.window,
+                }
+        return summary
+
+
+    def status_text(self, queue_depth:int, dropped_frames:int, dropped_sweeps:int, duplicates:int) -> str:
+        """Readout for the stats overlay
+
+        Args:
+            queue_depth (int): Traces read that the view has not drawn yet
+            dropped_frames (int): Traces replaced before the GUI took them
+            dropped_sweeps (int): Sweeps that were never read
+            duplicates (int): Reads that returned the previous sweep again
+
+        Returns:
+            str: Rates, stage times and counts, one group per line
+        """
+        summary = self.summary()
+        stages = [stage for stage in self.stages if stage != "sweep" or summary["sweep"]["per_second"]] # Sweep only while synchronized
+        times = "  ".join(f"{stage.capitalize()} {summary[stage]['mean_ms']:.1f} ms" for stage in stages)
+        return (
+            f"Read {summary['traces_per_second']:.1f}/s  Drawn {summary['render']['per_second']:.1f}/s\n"
+            f"{times}\n"
+            f"Queue {queue_depth}  Dropped {dropped_frames} frames, {dropped_sweeps} sweeps  Duplicates {duplicates}"
+        )
@@ -7,10 +7,13 @@ from PySide6.QtWidgets import (
     QLineEdit, 
     QPushButton,
     QHBoxLayout,
+    QComboBox,
+    QCheckBox,
 ) 
 from PySide6.QtGui import QIcon
 import json
 from ui.common.utilities import open_file_dialog
+from device.base_classes.session import TRANSPORTS
 
 
 class IpEntryDialog(QDialog):
@@ -46,6 +49,22 @@ class IpEntryDialog(QDialog):
         self.ip_input.returnPressed.connect(self.on_confirm)
         self.layout.addWidget(self.ip_input)
         
+        # Transport used to talk to the instrument
+        transport_layout = QHBoxLayout()
+        transport_layout.addWidget(QLabel("Transport:"))
+        self.transport_input = QComboBox()
+        self.transport_input.addItems(list(TRANSPORTS.keys()))
+        transport_layout.addWidget(self.transport_input)
+        self.layout.addLayout(transport_layout)
+        
+        # Keep the instrument's configuration instead of resetting it
+        self.attach_input = QCheckBox("Attach without reset")
+        self.layout.addWidget(self.attach_input)
+        
+        # Keep a measurement channel per mode instead of replacing the channel on every mode change
+        self.persistent_channels_input = QCheckBox("Keep a channel per mode")
+        self.layout.addWidget(self.persistent_channels_input)
+        
         # add the button on the bottom of the window
         self.confirm_button = QPushButton("Connect")
         self.confirm_button.clicked.connect(self.on_confirm)
@@ -75,6 +94,9 @@ class IpEntryDialog(QDialog):
         
         self.config = {
             'ip_address': ip_address, 
+            'transport': self.transport_input.currentText(),
+            'attach': self.attach_input.isChecked(),
+            'persistent_channels': self.persistent_channels_input.isChecked(),
             'data': {}
         }
         
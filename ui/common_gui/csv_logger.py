@@ -28,6 +28,8 @@ class TraceLogger(QObject):
         self.trace_count = 0
         self.is_logging = False
         self.current_filepath = None
+        self.marker_file = None  # Sibling CSV of the markers, opened by the first log_markers call
+        self.marker_writer = None
 
 
     def prompt_for_file(self) -> Path | None:
@@ -104,8 +106,12 @@ class TraceLogger(QObject):
         try:
             if self.csv_file:
                 self.csv_file.close()
+            if self.marker_file:
+                self.marker_file.close()
             self.csv_file = None
             self.csv_writer = None
+            self.marker_file = None
+            self.marker_writer = None
             self.is_logging = False
             self.current_filepath = None
         except IOError as e:
@@ -133,3 +139,32 @@ class TraceLogger(QObject):
             self.stop_logging()
 
 
+    def log_markers(self, names: list[str], positions: np.ndarray, levels: np.ndarray):
+        """
+        Log the markers of the last logged trace to a CSV file next to the trace file.
+
+        Args:
+            names: Marker names, e.g. M1, or D2 for a delta marker
+            positions: Frequency or time of every marker, relative to marker 1 for delta markers
+            levels: Level of every marker, relative to marker 1 for delta markers
+        """
+        if not self.is_logging or not self.csv_writer:
+            return
+
+        try:
+            if self.marker_writer is None:
+                marker_filepath = self.current_filepath.with_name(f"{self.current_filepath.stem}_markers.csv")
+                self.marker_file = open(marker_filepath, 'w', newline='')
+                self.marker_writer = csv.writer(self.marker_file)
+                self.marker_writer.writerow(['Timestamp', 'Trace', 'Marker', 'Frequency', 'Amplitude'])
+
+            timestamp = datetime.now().isoformat()
+            # Trace is the number of the trace in the trace file the markers belong to
+            self.marker_writer.writerows(
+                [timestamp, self.trace_count, name, position, level]
+                for name, position, level in zip(names, positions, levels)
+            )
+            self.marker_file.flush()
+        except IOError as e:
+            self.error_occurred.emit(f"Error logging markers: {str(e)}")
+            self.stop_logging()
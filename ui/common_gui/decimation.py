@@ -0,0 +1,47 @@
+# decimation.py
+
+import numpy as np
+
+
+def minmax_decimate(x:np.ndarray, y:np.ndarray, x_range:tuple[float, float], buckets:int) -> tuple[np.ndarray, np.ndarray]:
+    """Reduces a trace to the minimum and maximum of every pixel column of the visible range, so narrow peaks stay visible
+
+    Traces that have no more than two points per bucket in the visible range are returned as views, at full resolution.
+
+    Args:
+        x (np.ndarray): Sorted x values
+        y (np.ndarray): y values
+        x_range (tuple[float, float]): Visible x range
+        buckets (int): Number of buckets, the plot width in pixels
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The x and y values to draw
+    """
+    # One point past each edge so the line runs to the border of the plot
+    start = max(int(np.searchsorted(x, x_range[0], side="left")) - 1, 0)
+    stop = min(int(np.searchsorted(x, x_range[1], side="right")) + 1, len(x))
+
+    points = stop - start
+    if buckets <= 0 or points <= 2 * buckets:
+        return x[start:stop], y[start:stop]
+
+    size = -(-points // buckets) # Points per bucket, rounded up
+    full = points // size * size # Points in complete buckets, the rest is drawn as is
+
+    blocks = y[start:start + full].reshape(-1, size)
+    count = len(blocks)
+
+    decimated_x = np.empty(2 * count + points - full, dtype=x.dtype)
+    decimated_y = np.empty(2 * count + points - full, dtype=y.dtype)
+
+    np.min(blocks, axis=1, out=decimated_y[0:2 * count:2])
+    np.max(blocks, axis=1, out=decimated_y[1:2 * count:2])
+
+    bucket_x = x[start:start + full:size]
+    decimated_x[0:2 * count:2] = bucket_x
+    decimated_x[1:2 * count:2] = bucket_x + (x[start + size - 1] - x[start]) # Max at the end of the bucket
+
+    decimated_x[2 * count:] = x[start + full:stop]
+    decimated_y[2 * count:] = y[start + full:stop]
+
+    return decimated_x, decimated_y
@@ -1,27 +1,80 @@
 # main_window.py
 
 from PySide6.QtGui import QIcon
+from PySide6.QtCore import QTimer, Qt
 from PySide6.QtWidgets import (
     QMainWindow,
     QTabWidget,
+    QWidget,
+    QVBoxLayout,
+    QLabel,
+    QCheckBox,
+    QPushButton,
 )
 
-import ui.fsw_gui.mode_spec as FSW43Spec
-import ui.fsw_gui.mode_rts as FSW43Rts
-import ui.fsw_gui.mode_zero_span as FSW43Zs
-import ui.cxa_gui.mode_spec as CXASpec
-import ui.cxa_gui.mode_zero_span as CXAZs
+from device.base_classes.session import open_session
+from ui.common.utilities import save_file_dialog
 
-import ui.common_gui.mode_default as Default
+import importlib
+import time
 
-from device.device_classes.rs_fsw43 import RsFsw43
-from device.device_classes.kt_cxa import KtCxa
-from device.base_classes.settings_manager import SettingsManager
 
-from pyvisa import ResourceManager
+# Device classes by IDN and mode tabs by device type, as "module:Class" so only the modules of the connected device are imported
+DEVICE_CLASSES = {
+    "Rohde&Schwarz,FSW-43": "device.device_classes.rs_fsw43:RsFsw43",
+    "Keysight Technologies,N9000B": "device.device_classes.kt_cxa:KtCxa",
+}
+DEFAULT_DEVICE_CLASS = "device.base_classes.settings_manager:SettingsManager"
+
+MODE_TABS = {
+    "Rhode & Schwarz FSW-43": {
+        "Spectrum": "ui.fsw_gui.mode_spec:ModeSpec",
+        "Real-Time Spectrum": "ui.fsw_gui.mode_rts:ModeRts",
+        "Zero-Span": "ui.fsw_gui.mode_zero_span:ModeZs",
+    },
+    "Keysight Technologies CXA N9000B": {
+        "Spectrum": "ui.cxa_gui.mode_spec:ModeSpec",
+        "Zero-Span": "ui.cxa_gui.mode_zero_span:ModeZs",
+    },
+}
+DEFAULT_MODE_TAB = "ui.common_gui.mode_default:ModeDefault"
+
+
+def import_class(path:str) -> type:
+    """Imports a class from a "module:Class" string
+
+    Args:
+        path (str): Module and class name separated by a colon
+
+    Returns:
+        type: The class
+    """
+    module_name, class_name = path.split(":")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+class TabPlaceholder(QWidget):
+    def __init__(self, mode:str, parent=None):
+        """Stands in for a mode tab until the tab is first opened
+
+        Args:
+            mode (str): The mode of the tab
+            parent (QWidget, optional): The parent widget. Defaults to None.
+        """
+        super().__init__(parent)
+        self.mode = mode
+        
+        layout = QVBoxLayout()
+        label = QLabel(f"Loading {mode} Mode...")
+        label.setAlignment(Qt.AlignCenter)
+        layout.addWidget(label)
+        self.setLayout(layout)
 
 
 class MainWindow(QMainWindow):
+    idle_tab_timeout = 300 # Seconds a hidden tab is kept before it is torn down
+    idle_check_period = 30000 # Milliseconds between checks for idle tabs
+    
     def __init__(self, config: dict):
         """Main window for the GUI
 
@@ -32,28 +85,22 @@ class MainWindow(QMainWindow):
         """
         super().__init__()
         
-        instrument_objects = {
-            "Rohde&Schwarz,FSW-43": RsFsw43,
-            "Keysight Technologies,N9000B": KtCxa
-        }
+        transport = config.get('transport', 'VXI-11') # Configs saved before the transport option use VXI-11
+        attach = config.get('attach', False) # Keep the instrument's configuration instead of resetting it
+        persistent_channels = config.get('persistent_channels', False) # One channel per mode, switching tabs selects a channel instead of rebuilding it
         
-        rm = ResourceManager("@py")
+        # One session identifies the instrument and is then handed to the device class
         try:
-            instr = rm.open_resource(f"TCPIP::{config['ip_address']}::INSTR")
-            idn = instr.query('*IDN?')
-            instr.close()
+            session, idn = open_session(config['ip_address'], transport)
         except Exception as ex:
             print(f'Error finding instrument:\n{ex.args[0]}') # Error
             exit()
         
         # NEED TO FIX, I WANT TO USE SETTINGS MANAGER CLASS IF NO DERIVED CLASS FOR THAT INSTRUMENT EXIST. SETTING MANGER ALSO TAKE THE FILEPATH CONFIG
-        try:
-            device_class = next((value for key, value in instrument_objects.items() if key in idn))
-        except StopIteration:
-            device_class = SettingsManager
+        device_class = import_class(next((value for key, value in DEVICE_CLASSES.items() if key in idn), DEFAULT_DEVICE_CLASS))
         
         # Creates instance of the SettingsManager class that controls the instrument
-        self.instrument = device_class(config['ip_address'])
+        self.instrument = device_class(config['ip_address'], transport=transport, session=session, idn=idn, attach=attach, persistent_channels=persistent_channels)
         
         # with open(r"configs\device_configs\device_types\configs.json", "r") as file:
         #     self.devices_config = json.load(file)
@@ -69,10 +116,19 @@ class MainWindow(QMainWindow):
         
         self._create_tabs() # Creates the tabs
         
-        current_tab_widget = self.tab_widget.widget(self.current_tab_index)
+        if self.instrument.current_mode in self.tab_indicies:
+            # An attached instrument can be in any mode, open its tab without switching the mode again
+            self.tab_widget.blockSignals(True)
+            self.tab_widget.setCurrentIndex(self.tab_indicies[self.instrument.current_mode])
+            self.tab_widget.blockSignals(False)
+            self.current_tab_index = self.tab_widget.currentIndex()
+        
+        current_tab_widget = self.tab_at(self.current_tab_index)
         
         if config['data']:
             current_tab_widget.load_settings(config)
+        elif attach:
+            current_tab_widget.refresh() # attach already read every setting of the mode, only unknown ones are queried
         else:
             current_tab_widget.verify()
     
@@ -97,22 +153,54 @@ class MainWindow(QMainWindow):
             f'Connected to {self.device_type} @ {ip_address}', 
             timeout=0
             )
+        
+        # Optional readout of the per command SCPI latency
+        self.stats_label = QLabel()
+        self.stats_label.hide()
+        status_bar.addPermanentWidget(self.stats_label)
+        
+        self.stats_checkbox = QCheckBox("SCPI Stats")
+        self.stats_checkbox.toggled.connect(self.toggle_stats)
+        status_bar.addPermanentWidget(self.stats_checkbox)
+        
+        self.save_stats_button = QPushButton("Save Stats")
+        self.save_stats_button.pressed.connect(self.save_stats)
+        status_bar.addPermanentWidget(self.save_stats_button)
+        
+        self.stats_timer = QTimer(self)
+        self.stats_timer.timeout.connect(self.update_stats_readout)
+    
+    
+    def toggle_stats(self, enabled:bool) -> None:
+        """Turns the SCPI latency stats and their readout on or off
+
+        Args:
+            enabled (bool): True to record and show the stats
+        """
+        self.instrument.enable_stats(enabled)
+        self.stats_label.setVisible(enabled)
+        if enabled:
+            self.update_stats_readout()
+            self.stats_timer.start(1000)
+        else:
+            self.stats_timer.stop()
+    
+    
+    def update_stats_readout(self) -> None:
+        """Refreshes the SCPI latency readout"""
+        self.stats_label.setText(self.instrument.stats.status_text())
+    
+    
+    def save_stats(self) -> None:
+        """Saves the SCPI latency stats to a JSON file"""
+        filepath = save_file_dialog('Save JSON file', r'data\scpi_stats.json', '.json', self)
+        
+        if filepath:
+            self.instrument.dump_stats(filepath)
     
     
     def _create_tabs(self) -> None:
         """Creats the tab widget and initiates the individual tab widgets"""
-        tab_widgets = {
-            "Rhode & Schwarz FSW-43": {
-                "Spectrum": FSW43Spec.ModeSpec,
-                "Real-Time Spectrum": FSW43Rts.ModeRts,
-                "Zero-Span": FSW43Zs.ModeZs
-            },
-            "Keysight Technologies CXA N9000B": {
-                "Spectrum": CXASpec.ModeSpec,
-                "Zero-Span": CXAZs.ModeZs
-            }
-        }
-        
         # Create and set the tab widget
         self.tab_widget = QTabWidget()
         self.setCentralWidget(self.tab_widget)
@@ -121,26 +209,94 @@ class MainWindow(QMainWindow):
         
         self.current_tab_index = 0
         
+        # Tabs are built the first time they are opened, until then a placeholder holds their place
+        self.tab_classes = {mode: MODE_TABS.get(self.device_type, {}).get(mode, DEFAULT_MODE_TAB) for mode in self.modes}
+        self.tab_left_at = {} # Index of a built tab that is not shown: time it was left
+        
         for mode in self.modes:
-            tab = tab_widgets.get(self.device_type, {}).get(mode, Default.ModeDefault)
-            self.tab_widget.addTab(tab(self.instrument, self.tab_widget), f"{mode} Mode")
+            self.tab_widget.addTab(TabPlaceholder(mode), f"{mode} Mode")
         
         # When the tab changes, function called
         self.tab_widget.currentChanged.connect(self.on_tab_changed)
+        
+        # Hidden tabs that were not opened for a while are torn down again
+        self.idle_tab_timer = QTimer(self)
+        self.idle_tab_timer.timeout.connect(self.teardown_idle_tabs)
+        self.idle_tab_timer.start(self.idle_check_period)
+    
+    
+    def tab_at(self, index:int) -> QWidget:
+        """Gets the tab at an index, building it if only its placeholder exists
+
+        Args:
+            index (int): Index of the tab
+
+        Returns:
+            QWidget: The mode tab
+        """
+        widget = self.tab_widget.widget(index)
+        if not isinstance(widget, TabPlaceholder):
+            return widget
+        
+        tab = import_class(self.tab_classes[widget.mode])(self.instrument, self.tab_widget) # The tab's module is imported the first time it is opened
+        self._replace_tab(index, tab)
+        return tab
+    
+    
+    def teardown_idle_tabs(self) -> None:
+        """Replaces the tabs that have been hidden for longer than idle_tab_timeout with placeholders"""
+        now = time.monotonic()
+        for index, left_at in list(self.tab_left_at.items()):
+            if index == self.tab_widget.currentIndex() or now - left_at < self.idle_tab_timeout:
+                continue
+            
+            tab = self.tab_widget.widget(index)
+            if not tab.can_suspend():
+                continue
+            
+            tab.teardown()
+            self._replace_tab(index, TabPlaceholder(list(self.modes)[index]))
+            tab.deleteLater()
+            del self.tab_left_at[index]
+    
+    
+    def _replace_tab(self, index:int, widget:QWidget) -> None:
+        """Swaps the widget of a tab without firing the tab change
+
+        Args:
+            index (int): Index of the tab
+            widget (QWidget): The new widget
+        """
+        old_widget = self.tab_widget.widget(index)
+        current_index = self.tab_widget.currentIndex()
+        text = self.tab_widget.tabText(index)
+        
+        self.tab_widget.blockSignals(True)
+        self.tab_widget.removeTab(index)
+        self.tab_widget.insertTab(index, widget, text)
+        self.tab_widget.setCurrentIndex(current_index)
+        self.tab_widget.blockSignals(False)
+        
+        if isinstance(old_widget, TabPlaceholder):
+            old_widget.deleteLater()
     
     
     def on_tab_changed(self, new_tab_index:int) -> None:
-        """Run this when the tab is changed, changes the mode of the device and verify the values
+        """Run this when the tab is changed, changes the mode of the device and refreshes the tab
 
         Args:
             new_tab_index (int): Index of the new tab
         """
-        new_tab_widget = self.tab_widget.widget(new_tab_index)
+        new_tab_widget = self.tab_at(new_tab_index)
+        
+        if self.current_tab_index != new_tab_index and not isinstance(self.tab_widget.widget(self.current_tab_index), TabPlaceholder):
+            self.tab_left_at[self.current_tab_index] = time.monotonic()
+        self.tab_left_at.pop(new_tab_index, None)
         
-        new_tab_widget.set_mode()
+        results = new_tab_widget.set_mode() # Restores and verifies only the settings that differ
         
         if not self._programmatic_change:
-            new_tab_widget.verify()
+            new_tab_widget.refresh(results)
         
         self.current_tab_index = new_tab_index
     
@@ -16,11 +16,15 @@ from PySide6.QtCore import (
     Qt,
 )
 from ui.common_gui.setting_widgets import NumericalSettingBox, ModeSettingBox, DisplaySettingBox
+from ui.common_gui.trace_widget import SpectralWidget
 from ui.common.utilities import save_file_dialog, open_file_dialog
 from device.base_classes.settings_manager import SettingsManager
+from device.base_classes.shadow_state import ShadowState
 import json
 
 class ModeSuper(QWidget):
+    _logo_pixmap = None # The scaled logo, shared by every tab
+    
     def __init__(self, mode:str, device: SettingsManager, parent):
         """Base class for the widgets that become the tab
 
@@ -68,10 +72,11 @@ class ModeSuper(QWidget):
         title.setAlignment(Qt.AlignLeft | Qt.AlignTop)
         title.setObjectName('title')
         
-        img= QImage('images\\crc_icon.png')
-        pixmap = QPixmap(img.scaledToWidth(100))
+        if ModeSuper._logo_pixmap is None:
+            img= QImage('images\\crc_icon.png')
+            ModeSuper._logo_pixmap = QPixmap(img.scaledToWidth(100))
         crc_logo = QLabel(self)
-        crc_logo.setPixmap(pixmap)
+        crc_logo.setPixmap(ModeSuper._logo_pixmap)
         crc_logo.setAlignment(Qt.AlignRight | Qt.AlignTop)
         
         layout = QHBoxLayout()
@@ -112,9 +117,28 @@ class ModeSuper(QWidget):
         self.content_layout.addLayout(layout1, 0, 0, 1, 2)
     
     
-    def set_mode(self) -> None:
-        """Set the mode of the instrument to the current one"""
-        self.instrument.set_mode(self.mode)
+    def can_suspend(self) -> bool:
+        """Checks if this tab can be torn down while it is not shown
+
+        Returns:
+            bool: False while one of its trace widgets is logging
+        """
+        return not any(widget.is_busy() for widget in self.findChildren(SpectralWidget))
+    
+    
+    def teardown(self) -> None:
+        """Releases the trace widgets before the tab is deleted, the setting values stay in the instrument"""
+        for widget in self.findChildren(SpectralWidget):
+            widget.teardown()
+    
+    
+    def set_mode(self) -> dict:
+        """Set the mode of the instrument to the current one
+
+        Returns:
+            dict: Verify results of the settings the instrument restored for this mode
+        """
+        return self.instrument.set_mode(self.mode)
     
     
     def create_setting_box_widget(self, setting_name:str) -> None:
@@ -154,7 +178,7 @@ class ModeSuper(QWidget):
             dict: A dictionary containing the name of the setting and a tuple containing a boolean status and a string message
         """
         setting_names = list(self.settings_widgets.keys())
-        return self.instrument.verify_all_settings(setting_names)
+        return self.instrument.verify_all_settings(setting_names, bulk=True)
     
     
     def apply_all_settings(self) -> dict:
@@ -164,20 +188,23 @@ class ModeSuper(QWidget):
             dict: The results of the setting returned as a dict of setting names and a tuple containing a boolean and a message
         """
         setting_names_values = {key: setting.get_value() for key, setting in self.settings_widgets.items() if setting.changed}
-        return self.instrument.set_all_settings(setting_names_values)
+        return self.instrument.set_all_settings(setting_names_values, batched=True)
     
     
     def apply(self) -> None:
-        """Sets all current settings and the verifies the result, then updates the widget
+        """Sets all changed settings and verifies the ones that were written, then updates the widgets. Settings that were
+        skipped because the instrument already had the value are not read back
         """
         all_set_results = self.apply_all_settings()
-        all_verify_results = self.verify_all_settings()
+        
+        written = [name for name in all_set_results if self.instrument.shadow.state(name) != ShadowState.SYNCED] # Written or failed, not read back yet
+        all_verify_results = self.instrument.verify_all_settings(written, bulk=True) if written else {}
         
         for name, (set_result, set_status) in all_set_results.items():
             widget = self.settings_widgets[name]
             current_value = self.instrument.settings[name].current_value
             
-            (verify_result, verify_status) = all_verify_results[name]
+            (verify_result, verify_status) = all_verify_results.get(name, (set_result, set_status))
             
             if set_result and verify_result:
                 widget.set_status(True, "Set Correctly & Verified!")
@@ -204,6 +231,35 @@ class ModeSuper(QWidget):
             widget.set_value(current_value)
     
     
+    def refresh(self, results:dict = None) -> None:
+        """Updates the widgets from the values the instrument already knows. Only settings whose value is unknown are queried
+
+        Args:
+            results (dict, optional): Verify results that are already known, e.g. from set_mode. Defaults to None.
+        """
+        results = dict(results or {})
+        
+        unknown = [name for name in self.settings_widgets if name not in results and self.instrument.shadow.state(name) == ShadowState.UNKNOWN]
+        if unknown:
+            results.update(self.instrument.verify_all_settings(unknown, bulk=True))
+        
+        for name, widget in self.settings_widgets.items():
+            current_value = self.instrument.settings[name].current_value
+            
+            if name in results:
+                result, status = results[name]
+                if result:
+                    widget.set_status(True, "Set Correctly & Verified!")
+                else:
+                    widget.set_status(False, f"Verify_status:{status}")
+            elif self.instrument.shadow.state(name) == ShadowState.DIRTY:
+                widget.set_status(True, "Set, not read back yet")
+            else:
+                widget.set_status(True, "Set Correctly & Verified!")
+            
+            widget.set_value(current_value)
+    
+    
     def load(self) -> None:
         """File dialog to select preset to load"""
         filepath = open_file_dialog('Open JSON file', r'user_configs', '.json', self)
@@ -225,9 +281,9 @@ class ModeSuper(QWidget):
         
         self.main_window.change_tab_programmatically(tab_indicies[config['mode']])
         
-        self.instrument.set_all_settings(config['data'])
+        self.instrument.set_all_settings(config['data'], batched=True)
         
-        self.tab_widget.widget(tab_indicies[config['mode']]).verify()
+        self.main_window.tab_at(tab_indicies[config['mode']]).verify()
     
     
     def save(self) -> None:
@@ -238,6 +294,7 @@ class ModeSuper(QWidget):
             with open(filepath, 'w') as file:
                 config = {
                     'ip_address': self.instrument.ip_address,
+                    'transport': self.instrument.transport,
                     'mode': self.instrument.current_mode,
                 }
                 current_settings = {name: setting.get_value() for name, setting in self.settings_widgets.items() if isinstance(setting, (NumericalSettingBox, ModeSettingBox))}
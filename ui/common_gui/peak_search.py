@@ -0,0 +1,121 @@
+# peak_search.py
+
+import numpy as np
+
+
+class PeakSearch():
+    def __init__(self, count:int = 0, threshold:float = -90.0, excursion:float = 6.0, tracking:bool = True, track_distance:float = 0.01):
+        """Finds the highest peaks of a trace on the host, markers without CALC:MARK round trips
+
+        A peak is a local maximum above the threshold that rises at least the excursion above the lowest
+        point between it and each neighbouring peak. Every step runs on whole arrays.
+
+        Args:
+            count (int, optional): Number of markers, 0 turns the search off. Defaults to 0.
+            threshold (float, optional): Lowest level in dBm a peak may have. Defaults to -90.0.
+            excursion (float, optional): dB a peak must rise above the valleys next to it. Defaults to 6.0.
+            tracking (bool, optional): Keep marker numbers on the same peaks from sweep to sweep. Defaults to True.
+            track_distance (float, optional): Furthest a tracked peak may move between sweeps, as a fraction of the trace. Defaults to 0.01.
+        """
+        self.count = count
+        self.threshold = threshold
+        self.excursion = excursion
+        self.tracking = tracking
+        self.track_distance = track_distance
+        self.reset()
+
+
+    def reset(self) -> None:
+        """Forgets the tracked peaks, the next search numbers the markers by level"""
+        self.markers = np.empty(0, dtype=np.intp) # Trace index of every marker, marker 1 first, -1 for a marker without a peak
+
+
+    def find_peaks(self, y:np.ndarray) -> np.ndarray:
+        """Finds every peak of a trace
+
+        Args:
+            y (np.ndarray): Trace in dBm
+
+        Returns:
+            np.ndarray: Indices of the peaks, in trace order
+        """
+        if len(y) < 3:
+            return np.empty(0, dtype=np.intp)
+
+        # Local maxima, the first point of a flat top counts
+        peaks = np.flatnonzero((y[1:-1] > y[:-2]) & (y[1:-1] >= y[2:])) + 1
+        peaks = peaks[y[peaks] >= self.threshold]
+
+        # Of two neighbouring peaks without the excursion between them the lower one is dropped, until every valley is deep enough
+        while len(peaks) > 1:
+            valleys = np.minimum.reduceat(y, peaks)[:-1] # Lowest point between every peak and the next one
+            levels = y[peaks]
+            shallow = np.minimum(levels[:-1], levels[1:]) - valleys < self.excursion
+            if not shallow.any():
+                break
+
+            lower = np.where(levels[:-1] < levels[1:], np.arange(len(peaks) - 1), np.arange(1, len(peaks)))
+            keep = np.ones(len(peaks), dtype=bool)
+            keep[lower[shallow]] = False
+            peaks = peaks[keep]
+
+        return peaks
+
+
+    def top_peaks(self, y:np.ndarray, count:int) -> np.ndarray:
+        """Finds the highest peaks of a trace
+
+        Args:
+            y (np.ndarray): Trace in dBm
+            count (int): Number of peaks
+
+        Returns:
+            np.ndarray: Indices of up to count peaks, highest first
+        """
+        peaks = self.find_peaks(y)
+        if len(peaks) > count:
+            peaks = peaks[np.argpartition(y[peaks], -count)[-count:]] # Only the top count are sorted
+        return peaks[np.argsort(y[peaks])[::-1]]
+
+
+    def update(self, y:np.ndarray) -> np.ndarray:
+        """Places the markers on a new trace
+
+        With tracking on, every marker moves to the nearest new peak within the track distance, so its number
+        stays on the same signal. Markers that lost their peak take the highest peaks that are left.
+
+        Args:
+            y (np.ndarray): Trace in dBm
+
+        Returns:
+            np.ndarray: Trace index of every marker, marker 1 first, -1 for a marker without a peak
+        """
+        if self.count <= 0:
+            self.reset()
+            return self.markers
+
+        peaks = self.top_peaks(y, self.count)
+        markers = np.full(self.count, -1, dtype=np.intp)
+
+        previous = self.markers
+        if self.tracking and len(previous) == self.count and len(peaks):
+            # Closest pairs first, each marker and each peak is used once
+            distance = np.abs(previous[:, None] - peaks[None, :]).astype(np.float64)
+            distance[previous < 0, :] = np.inf
+            distance[distance > self.track_distance * len(y)] = np.inf
+
+            taken = np.zeros(len(peaks), dtype=bool)
+            for flat in np.argsort(distance, axis=None):
+                marker, peak = np.unravel_index(flat, distance.shape)
+                if not np.isfinite(distance[marker, peak]):
+                    break
+                if markers[marker] < 0 and not taken[peak]:
+                    markers[marker] = peaks[peak]
+                    taken[peak] = True
+            peaks = peaks[~taken] # Still highest first
+
+        free = np.flatnonzero(markers < 0)[:len(peaks)]
+        markers[free] = peaks[:len(free)]
+
+        self.markers = markers
+        return markers
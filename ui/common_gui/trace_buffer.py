@@ -0,0 +1,122 @@
+# trace_buffer.py
+
+import threading
+
+import numpy as np
+
+
+class TraceRingBuffer():
+    def __init__(self, depth:int, points:int = 0):
+        """Fixed size history of the latest traces in one preallocated float32 array
+
+        Every trace is written twice, depth rows apart, so the last n traces are always
+        one contiguous slice of the array and can be read as a view without copying.
+
+        Args:
+            depth (int): Number of traces kept
+            points (int, optional): Points per trace, the buffer is resized by the first trace that does not fit. Defaults to 0.
+        """
+        self.lock = threading.RLock() # Traces are appended on the acquisition thread, readers may hold it across several calls
+        self.depth = depth
+        self.resize(points)
+
+
+    def resize(self, points:int, depth:int = None) -> None:
+        """Reallocates the buffer, which drops the history
+
+        Args:
+            points (int): Points per trace
+            depth (int, optional): Number of traces kept. Defaults to None, which keeps the depth.
+        """
+        with self.lock:
+            self.depth = depth or self.depth
+            self.points = points
+            self.data = np.zeros((2 * self.depth, points), dtype=np.float32)
+            self.count = 0 # Traces appended since the last resize or clear
+
+
+    def clear(self) -> None:
+        """Forgets the history, the memory is kept"""
+        with self.lock:
+            self.count = 0
+
+
+    def append(self, trace:np.ndarray) -> int:
+        """Adds a trace, the oldest one is overwritten once the buffer is full
+
+        Args:
+            trace (np.ndarray): The trace, a trace of a different length resizes the buffer
+
+        Returns:
+            int: Sequence number of the trace since the last resize
+        """
+        if len(trace) != self.points:
+            self.resize(len(trace)) # Number of Points changed, the old traces do not fit anymore
+
+        with self.lock:
+            row = self.count % self.depth
+            self.data[row] = trace
+            self.data[row + self.depth] = trace
+            self.count += 1
+            return self.count - 1
+
+
+    def __len__(self) -> int:
+        """Number of traces in the buffer"""
+        return min(self.count, self.depth)
+
+
+    def last(self, n:int = None) -> np.ndarray:
+        """Gets the latest traces without copying them. A view of n traces is only valid for depth - n more appends,
+        the next append overwrites a row of a view of the whole buffer. Hold the lock while reading a view if the
+        acquisition is running, or use copy
+
+        Args:
+            n (int, optional): Number of traces. Defaults to None, which returns every trace in the buffer.
+
+        Returns:
+            np.ndarray: Read only (n, points) view, oldest trace first
+        """
+        with self.lock:
+            n = len(self) if n is None else min(n, len(self))
+            end = (self.count - 1) % self.depth + self.depth + 1 if self.count else self.depth
+            view = self.data[end - n:end]
+        view.flags.writeable = False
+        return view
+
+
+    def since(self, seen:int) -> tuple[np.ndarray, int]:
+        """Gets the traces appended after a sequence number that are still in the buffer
+
+        Args:
+            seen (int): Number of traces the caller already has, the count returned by the previous call
+
+        Returns:
+            tuple[np.ndarray, int]: Read only view of the new traces, oldest first, and the count to pass next time. Read the view while holding the lock
+        """
+        with self.lock:
+            if seen > self.count:
+                seen = 0 # The buffer was resized or cleared since
+            return self.last(min(self.count - seen, len(self))), self.count
+
+
+    def latest(self) -> np.ndarray | None:
+        """Gets the newest trace without copying it
+
+        Returns:
+            np.ndarray | None: Read only view of the trace, valid for depth - 1 more appends, None if the buffer is empty
+        """
+        return self.last(1)[0] if self.count else None
+
+
+    def copy(self, n:int = None) -> np.ndarray:
+        """Gets a copy of the latest traces, for readers that do not hold the lock, e.g. exports
+
+        Args:
+            n (int, optional): Number of traces. Defaults to None, which copies every trace in the buffer.
+
+        Returns:
+            np.ndarray: (n, points) array, oldest trace first
+        """
+        with self.lock:
+            return self.last(n).copy()
@@ -0,0 +1,146 @@
+# trace_processor.py
+
+import numpy as np
+
+
+class TraceProcessor():
+    OFF = "Off"
+    EXPONENTIAL_AVERAGE = "Exponential Average"
+    AVERAGE = "Average"
+    MAX_HOLD = "Max Hold"
+    MIN_HOLD = "Min Hold"
+    RMS = "RMS"
+    DETECTORS = (OFF, EXPONENTIAL_AVERAGE, AVERAGE, MAX_HOLD, MIN_HOLD, RMS)
+
+    def __init__(self, detector:str = OFF, count:int = 10):
+        """Trace detectors that run on the host, so changing them does not touch the instrument or reset its trace
+
+        The state is kept in arrays that are allocated once per trace length and updated in place for every trace.
+
+        Args:
+            detector (str, optional): One of the DETECTORS. Defaults to OFF.
+            count (int, optional): Number of traces averaged, also the time constant of the exponential average. Defaults to 10.
+        """
+        self.detector = detector
+        self.count = count
+        self.points = 0
+        self.reset()
+
+
+    def set_detector(self, detector:str) -> None:
+        """Changes the detector, which restarts it
+
+        Args:
+            detector (str): One of the DETECTORS
+        """
+        if detector not in self.DETECTORS:
+            raise ValueError(f"Unknown detector: {detector}")
+        self.detector = detector
+        self.reset()
+
+
+    def set_count(self, count:int) -> None:
+        """Changes the number of traces averaged, which restarts the detector
+
+        Args:
+            count (int): Number of traces
+        """
+        self.count = max(1, count)
+        self.reset()
+
+
+    def reset(self) -> None:
+        """Restarts the average or hold from the next trace"""
+        self.traces = 0 # Traces processed since the reset
+        self.points = 0 # Buffers are allocated by the next trace
+
+
+    def _allocate(self, points:int) -> None:
+        """Allocates the state for traces of a length"""
+        self.points = points
+        self.traces = 0
+        self.output = np.empty(points, dtype=np.float32)
+        self.state = np.empty(points, dtype=np.float64) # Average, hold or sum of the window
+        self.scratch = np.empty(points, dtype=np.float64)
+
+        if self.detector in (self.AVERAGE, self.RMS):
+            self.window = np.empty((self.count, points), dtype=np.float64) # The traces in the moving window, dBm or linear power
+
+
+    def process(self, trace:np.ndarray) -> np.ndarray:
+        """Adds a trace to the detector
+
+        Args:
+            trace (np.ndarray): Trace in dBm
+
+        Returns:
+            np.ndarray: The processed trace. The array is reused by the next call, copy it to keep it
+        """
+        if self.detector == self.OFF:
+            return trace
+
+        if len(trace) != self.points:
+            self._allocate(len(trace))
+
+        first = self.traces == 0
+        self.traces += 1
+
+        if self.detector == self.MAX_HOLD:
+            if first:
+                self.state[:] = trace
+            else:
+                np.maximum(self.state, trace, out=self.state)
+            self.output[:] = self.state
+
+        elif self.detector == self.MIN_HOLD:
+            if first:
+                self.state[:] = trace
+            else:
+                np.minimum(self.state, trace, out=self.state)
+            self.output[:] = self.state
+
+        elif self.detector == self.EXPONENTIAL_AVERAGE:
+            if first:
+                self.state[:] = trace
+            else:
+                # Plain mean until count traces are in, so the start is not weighted towards the first trace
+                weight = 1 / min(self.traces, self.count)
+                np.subtract(trace, self.state, out=self.scratch)
+                self.scratch *= weight
+                self.state += self.scratch
+            self.output[:] = self.state
+
+        else:
+            self._moving_average(trace, linear_power=self.detector == self.RMS)
+
+        return self.output
+
+
+    def _moving_average(self, trace:np.ndarray, linear_power:bool) -> None:
+        """Average of the last count traces, kept as a running sum of the window
+
+        Args:
+            trace (np.ndarray): Trace in dBm
+            linear_power (bool): Average the power in mW instead of the dBm values, the RMS detector
+        """
+        row = (self.traces - 1) % self.count
+
+        self.scratch[:] = trace
+        if linear_power:
+            self.scratch *= 0.1
+            np.power(10.0, self.scratch, out=self.scratch)
+
+        if self.traces == 1:
+            self.state[:] = self.scratch
+        elif self.traces > self.count:
+            self.state -= self.window[row] # The oldest trace leaves the window
+            self.state += self.scratch
+        else:
+            self.state += self.scratch
+        self.window[row] = self.scratch
+
+        np.divide(self.state, min(self.traces, self.count), out=self.scratch)
+        if linear_power:
+            np.log10(self.scratch, out=self.scratch)
+            self.scratch *= 10
+        self.output[:] = self.scratch
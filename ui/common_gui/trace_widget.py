@@ -8,12 +8,19 @@ from PySide6.QtWidgets import (
     QLabel,
     QPushButton,
     QMessageBox,
+    QComboBox,
+    QCheckBox,
 )
 from PySide6.QtCore import QTimer
-from PySide6.QtGui import QIntValidator
-from ui.common.utilities import remove_trailing_zeros
+from PySide6.QtGui import QDoubleValidator, QIntValidator
 from ui.common_gui.csv_logger import TraceLogger
+from ui.common_gui.acquisition import AcquisitionService
+from ui.common_gui.waterfall_widget import WaterfallWidget
+from ui.common_gui.trace_processor import TraceProcessor
+from ui.common_gui.decimation import minmax_decimate
+from ui.common_gui.peak_search import PeakSearch
 from pathlib import Path
+import time
 import pyqtgraph as pg
 import numpy as np
 
@@ -28,7 +35,10 @@ class SpectralWidget(QWidget):
         self.trace_logger = TraceLogger(self)  # Pass self as parent
         
         self.do_updates = True
-        default_update_period = 100
+        
+        self._x_axis_key = None # Setting values the cached x axis was built from
+        self._x_axis = None
+        default_update_period = AcquisitionService.default_update_period
         
         # Connect signals
         self.trace_logger.logging_started.connect(self.on_logging_started)
@@ -68,6 +78,23 @@ class SpectralWidget(QWidget):
         self.change_period_button.pressed.connect(self.set_update_timing)
         layout1.addWidget(self.change_period_button)
         
+        self.waterfall_button = QPushButton("Waterfall")
+        self.waterfall_button.setCheckable(True)
+        self.waterfall_button.toggled.connect(self.toggle_waterfall)
+        layout1.addWidget(self.waterfall_button)
+        
+        self.sweep_sync_button = QPushButton("Sweep Sync")
+        self.sweep_sync_button.setCheckable(True)
+        self.sweep_sync_button.setToolTip("Read every sweep exactly once, runs single sweeps and reads each one when it is done")
+        self.sweep_sync_button.toggled.connect(self.toggle_sweep_sync)
+        layout1.addWidget(self.sweep_sync_button)
+        
+        self.stats_button = QPushButton("Stats")
+        self.stats_button.setCheckable(True)
+        self.stats_button.setToolTip("Show the trace rate, the time spent per stage and the dropped and duplicate traces")
+        self.stats_button.toggled.connect(self.toggle_stats)
+        layout1.addWidget(self.stats_button)
+        
         self.plot_widget = pg.PlotWidget()
         self.plot_widget.setFixedSize(500,400)
         self.plot_widget.setYRange(-100, 10)
@@ -77,6 +104,25 @@ class SpectralWidget(QWidget):
         
         self.plot_line = self.plot_widget.plot(pen='b')
         
+        # Traces are decimated to the plot's width, zooming draws them again from the full traces
+        self._plot_x = None
+        self._plot_y = None
+        self._processed_y = None
+        self.plot_widget.getViewBox().sigXRangeChanged.connect(self.redraw)
+        
+        self.waterfall = None # Created the first time it is shown
+        self.plot_layout = layout
+        
+        # Stats overlay, placed on the view box so it stays in the corner when zooming
+        self.stats_text = pg.TextItem(color='k', fill=(255, 255, 255, 200), anchor=(0, 0))
+        self.stats_text.setParentItem(self.plot_widget.getViewBox())
+        self.stats_text.setPos(5, 5)
+        self.stats_text.hide()
+        self.stats_timer = QTimer(self)
+        self.stats_timer.setInterval(250) # Refreshed on its own, not per trace, so the overlay costs nothing at high trace rates
+        self.stats_timer.timeout.connect(self.update_stats)
+        self.drawn_count = 0 # History count when the last trace was drawn
+        
         if self.mode == "Zero-Span":
             self.plot_widget.setTitle("Zero-Span Trace (Power vs. Time)")
             self.plot_widget.setLabel('left', 'Power (dBm)')
@@ -86,6 +132,83 @@ class SpectralWidget(QWidget):
             self.plot_widget.setLabel('left', 'Power (dBm)')
             self.plot_widget.setLabel('bottom', 'Frequency (Hz)')
         
+        # Detectors that run on the computer, drawn as a second line
+        self.processor = TraceProcessor()
+        self.processed_seen = 0 # Traces of the history already given to the processor
+        self.processed_line = self.plot_widget.plot(pen='r')
+        
+        detector_layout = QHBoxLayout()
+        layout.addLayout(detector_layout)
+        
+        detector_layout.addWidget(QLabel("Detector: "))
+        
+        self.detector_input = QComboBox()
+        self.detector_input.addItems(TraceProcessor.DETECTORS)
+        self.detector_input.currentTextChanged.connect(self.set_detector)
+        detector_layout.addWidget(self.detector_input)
+        
+        detector_layout.addWidget(QLabel("Count: "))
+        
+        self.detector_count_entry = QLineEdit()
+        self.detector_count_entry.setValidator(QIntValidator(1, 10000))
+        self.detector_count_entry.setPlaceholderText(str(self.processor.count))
+        self.detector_count_entry.returnPressed.connect(self.set_detector_count)
+        detector_layout.addWidget(self.detector_count_entry)
+        
+        self.detector_reset_button = QPushButton("Reset")
+        self.detector_reset_button.pressed.connect(self.reset_detector)
+        detector_layout.addWidget(self.detector_reset_button)
+        
+        self.log_processed_checkbox = QCheckBox("Log Detector Trace")
+        detector_layout.addWidget(self.log_processed_checkbox)
+        
+        # Peak markers found on the computer, on the detector trace if there is one
+        self.peak_search = PeakSearch()
+        self.marker_points = pg.ScatterPlotItem(symbol='t', size=10, pen=None, brush='k')
+        self.plot_widget.addItem(self.marker_points)
+        self.marker_labels = [] # TextItems, one per marker, reused from trace to trace
+        self._markers = None # Names, positions and levels of the markers on the last trace
+        
+        marker_layout = QHBoxLayout()
+        layout.addLayout(marker_layout)
+        
+        marker_layout.addWidget(QLabel("Markers: "))
+        
+        self.marker_count_entry = QLineEdit()
+        self.marker_count_entry.setValidator(QIntValidator(0, 10))
+        self.marker_count_entry.setPlaceholderText(str(self.peak_search.count))
+        self.marker_count_entry.returnPressed.connect(self.set_marker_count)
+        marker_layout.addWidget(self.marker_count_entry)
+        
+        marker_layout.addWidget(QLabel("Threshold (dBm): "))
+        
+        self.marker_threshold_entry = QLineEdit()
+        self.marker_threshold_entry.setValidator(QDoubleValidator(-300, 100, 2))
+        self.marker_threshold_entry.setPlaceholderText(str(self.peak_search.threshold))
+        self.marker_threshold_entry.returnPressed.connect(self.set_marker_threshold)
+        marker_layout.addWidget(self.marker_threshold_entry)
+        
+        marker_layout.addWidget(QLabel("Excursion (dB): "))
+        
+        self.marker_excursion_entry = QLineEdit()
+        self.marker_excursion_entry.setValidator(QDoubleValidator(0, 200, 2))
+        self.marker_excursion_entry.setPlaceholderText(str(self.peak_search.excursion))
+        self.marker_excursion_entry.returnPressed.connect(self.set_marker_excursion)
+        marker_layout.addWidget(self.marker_excursion_entry)
+        
+        self.delta_markers_checkbox = QCheckBox("Delta")
+        self.delta_markers_checkbox.setToolTip("Show markers 2 and up relative to marker 1")
+        marker_layout.addWidget(self.delta_markers_checkbox)
+        
+        self.track_markers_checkbox = QCheckBox("Track")
+        self.track_markers_checkbox.setToolTip("Keep every marker on the same peak from sweep to sweep")
+        self.track_markers_checkbox.setChecked(self.peak_search.tracking)
+        self.track_markers_checkbox.toggled.connect(self.set_marker_tracking)
+        marker_layout.addWidget(self.track_markers_checkbox)
+        
+        self.log_markers_checkbox = QCheckBox("Log Markers")
+        marker_layout.addWidget(self.log_markers_checkbox)
+        
         layout2 = QHBoxLayout()
         layout.addLayout(layout2)
         
@@ -107,47 +230,338 @@ class SpectralWidget(QWidget):
         self.trace_count_label = QLabel()
         layout3.addWidget(self.trace_count_label)
         
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update_plot)
-        self.timer.start(default_update_period)
+        self.sweep_label = QLabel()
+        layout3.addWidget(self.sweep_label)
+        
+        # Traces come from the instrument's shared acquisition service, which only polls for visible views
+        self.acquisition = AcquisitionService.for_device(self.device)
+        self.acquisition.error_occurred.connect(self.on_acquisition_error)
+        self.acquisition.subscribe(self)
     
     
-    def update_plot(self):
+    def showEvent(self, event) -> None:
+        super().showEvent(event)
+        self.acquisition.set_view_active(self, self.do_updates)
+    
+    
+    def hideEvent(self, event) -> None:
+        super().hideEvent(event)
+        self.acquisition.set_view_active(self, False)
+    
+    
+    def toggle_waterfall(self, visible: bool) -> None:
+        """Shows or hides the live waterfall under the plot
+
+        Args:
+            visible (bool): True to show the waterfall
+        """
+        if visible and self.waterfall is None:
+            self.waterfall = WaterfallWidget()
+            self.waterfall.setFixedSize(500, 300)
+            self.waterfall.seen = self.history.count # Start with the next trace
+            self.plot_layout.insertWidget(self.plot_layout.indexOf(self.plot_widget) + 1, self.waterfall)
+        
+        if self.waterfall is not None:
+            self.waterfall.setVisible(visible)
+    
+    
+    def toggle_stats(self, visible: bool) -> None:
+        """Shows or hides the acquisition stats overlay
+
+        Args:
+            visible (bool): True to show the overlay
+        """
+        self.stats_text.setVisible(visible)
+        if visible:
+            self.update_stats()
+            self.stats_timer.start()
+        else:
+            self.stats_timer.stop()
+    
+    
+    def update_stats(self) -> None:
+        """Refreshes the stats overlay"""
+        acquisition = self.acquisition
+        self.stats_text.setText(acquisition.stats.status_text(
+            queue_depth=max(self.history.count - self.drawn_count, 0),
+            dropped_frames=acquisition.dropped_frames,
+            dropped_sweeps=acquisition.dropped_sweeps,
+            duplicates=acquisition.duplicate_traces,
+            ))
+    
+    
+    def toggle_sweep_sync(self, enabled: bool) -> None:
+        """Reads once per finished sweep instead of polling, for every view of the instrument
+
+        Args:
+            enabled (bool): True to synchronize with the sweeps
+        """
+        self.acquisition.set_sweep_synced(enabled)
+    
+    
+    @property
+    def history(self):
+        """The latest traces of this widget's mode, read without querying the instrument again
+
+        Returns:
+            TraceRingBuffer: The trace history
+        """
+        return self.acquisition.history(self.mode)
+    
+    
+    def is_busy(self) -> bool:
+        """Checks if the widget is doing work that a teardown would lose
+
+        Returns:
+            bool: True while traces are being logged
+        """
+        return self.trace_logger.is_logging
+    
+    
+    def teardown(self) -> None:
+        """Stops logging and leaves the acquisition service, called before the widget is deleted"""
+        if self.trace_logger.is_logging:
+            self.trace_logger.stop_logging()
+        self.stats_timer.stop()
+        self.acquisition.error_occurred.disconnect(self.on_acquisition_error)
+        self.acquisition.unsubscribe(self)
+    
+    
+    def x_axis(self, points:int) -> np.ndarray:
+        """Gets the time or frequency axis of the traces. It is only rebuilt when the settings it depends on change
+
+        The points come from the trace, not from Number of Points. A trace read before a points change or in a mode
+        whose trace length differs, e.g. RTS, still gets an axis over the same start and stop
+
+        Args:
+            points (int): Number of points of the trace
+
+        Returns:
+            np.ndarray: Read only axis, shared by the plot and the logger
+        """
+        settings = self.device.settings
+        if self.mode == "Zero-Span":
+            key = (settings['Sweep Time'].current_value, points)
+        else:
+            key = (settings['Center Frequency'].current_value, settings['Frequency Span'].current_value, points)
+        
+        if key == self._x_axis_key:
+            return self._x_axis
+        
+        if self.mode == "Zero-Span":
+            start, stop = 0.0, float(key[0])
+        else:
+            center_freq = float(key[0])
+            freq_span = float(key[1])
+            start, stop = center_freq - (freq_span / 2), center_freq + (freq_span / 2)
+        
+        x = np.linspace(start, stop, points)
+        x.flags.writeable = False # Shared without copies, nothing may change it
+        
+        self.plot_widget.setXRange(start, stop)
+        
+        self._x_axis_key = key
+        self._x_axis = x
+        return x
+    
+    
+    def update_plot(self, y: np.ndarray):
         if self.do_updates:
-            num_points = int(remove_trailing_zeros(self.device.settings['Number of Points'].current_value))
+            x = self.x_axis(len(y)) # Follows the trace, so a Number of Points that differs from the trace never stops the plot
             
-            if self.mode == "Zero-Span":
-                sweep_time = float(self.device.settings['Sweep Time'].current_value)
-                
-                x = [i * (sweep_time / (num_points - 1)) for i in range(num_points)]
-                
-                self.plot_widget.setXRange(0,sweep_time)
-            else:
-                center_freq = float(self.device.settings['Center Frequency'].current_value)
-                freq_span = float(self.device.settings['Frequency Span'].current_value)
-                
-                start_freq = center_freq - (freq_span / 2)
-                end_freq = center_freq + (freq_span / 2)
-                
-                x = [start_freq + (i * (freq_span / (num_points - 1))) for i in range(num_points)]
-                
-                self.plot_widget.setXRange(start_freq,end_freq)
+            stats = self.acquisition.stats
+            start = time.perf_counter()
+            self.drawn_count = self.history.count
+            
+            processed = self.process_new_traces()
             
-            y = self.device.get_trace()
+            self._plot_x = x
+            self._plot_y = y
+            self._processed_y = processed if processed is not None and len(processed) == len(x) else None
+            self.redraw()
+            self.update_markers(x, self._processed_y if self._processed_y is not None else y)
             
-            self.plot_line.setData(x, y)
+            if self.waterfall is not None and self.waterfall.isVisible():
+                self.waterfall.set_x_axis(x[0], x[-1], 'Time (s)' if self.mode == "Zero-Span" else 'Frequency (Hz)')
+                self.waterfall.update_from_history(self.history) # One row per trace read, including traces the plot skipped
             
-            self.trace_logger.log_trace(np.array(x), np.array(y))
+            stats.record("render", time.perf_counter() - start) # Detector, decimation, setData and waterfall
+            
+            self.sweep_label.setText(f"Sweep: {self.acquisition.last_sweep}  Duplicates: {self.acquisition.duplicate_traces}  Dropped: {self.acquisition.dropped_sweeps}")
+            
+            if self.trace_logger.is_logging:
+                start = time.perf_counter()
+                if self.log_processed_checkbox.isChecked() and processed is not None and len(processed) == len(x):
+                    self.trace_logger.log_trace(x, processed)
+                else:
+                    self.trace_logger.log_trace(x, y)
+                if self.log_markers_checkbox.isChecked() and self._markers is not None:
+                    self.trace_logger.log_markers(*self._markers)
+                stats.record("log", time.perf_counter() - start)
+    
+    
+    def redraw(self) -> None:
+        """Draws the latest traces, reduced to the minimum and maximum of every pixel column of the visible range"""
+        x = self._plot_x
+        if x is None or len(x) != len(self._plot_y):
+            return # The x axis changed before the next trace arrived
+        
+        view_box = self.plot_widget.getViewBox()
+        x_range = view_box.viewRange()[0]
+        buckets = int(view_box.width()) or self.plot_widget.width()
+        
+        self.plot_line.setData(*minmax_decimate(x, self._plot_y, x_range, buckets))
+        
+        if self._processed_y is not None:
+            self.processed_line.setData(*minmax_decimate(x, self._processed_y, x_range, buckets))
+    
+    
+    def update_markers(self, x: np.ndarray, y: np.ndarray) -> None:
+        """Places the peak markers on a trace and draws them
+
+        Args:
+            x (np.ndarray): Frequency or time axis
+            y (np.ndarray): The trace the markers are placed on
+        """
+        indices = self.peak_search.update(y)
+        numbers = np.flatnonzero(indices >= 0) + 1
+        indices = indices[indices >= 0]
+        
+        if not len(indices):
+            self._markers = None
+            self.marker_points.clear()
+            for label in self.marker_labels:
+                label.hide()
+            return
+        
+        positions = x[indices]
+        levels = y[indices].astype(np.float64)
+        self.marker_points.setData(positions, levels)
+        
+        names = [f"M{number}" for number in numbers]
+        logged_positions = positions.copy()
+        logged_levels = levels.copy()
+        if self.delta_markers_checkbox.isChecked() and numbers[0] == 1:
+            # Markers 2 and up are relative to marker 1
+            names[1:] = [f"D{number}" for number in numbers[1:]]
+            logged_positions[1:] -= positions[0]
+            logged_levels[1:] -= levels[0]
+        self._markers = (names, logged_positions, logged_levels)
+        
+        while len(self.marker_labels) < len(indices):
+            label = pg.TextItem(color='k', anchor=(0.5, 1.3))
+            self.plot_widget.addItem(label)
+            self.marker_labels.append(label)
+        
+        unit = 's' if self.mode == "Zero-Span" else 'Hz'
+        for i, label in enumerate(self.marker_labels):
+            if i >= len(indices):
+                label.hide()
+                continue
+            if names[i].startswith("D"):
+                text = f"{names[i]}\n\u0394{pg.siFormat(logged_positions[i], precision=6, suffix=unit)}\n{logged_levels[i]:+.2f} dB"
+            else:
+                text = f"{names[i]}\n{pg.siFormat(logged_positions[i], precision=6, suffix=unit)}\n{logged_levels[i]:.2f} dBm"
+            label.setText(text)
+            label.setPos(positions[i], levels[i])
+            label.show()
+    
+    
+    def set_marker_count(self) -> None:
+        """Changes the number of peak markers, 0 turns them off"""
+        count = self.marker_count_entry.text()
+        self.marker_count_entry.clear()
+        if count:
+            self.marker_count_entry.setPlaceholderText(count)
+            self.peak_search.count = int(count)
+            self.peak_search.reset()
+    
+    
+    def set_marker_threshold(self) -> None:
+        """Changes the lowest level a peak may have"""
+        threshold = self.marker_threshold_entry.text()
+        self.marker_threshold_entry.clear()
+        if threshold:
+            self.marker_threshold_entry.setPlaceholderText(threshold)
+            self.peak_search.threshold = float(threshold)
+    
+    
+    def set_marker_excursion(self) -> None:
+        """Changes how far a peak must rise above the valleys next to it"""
+        excursion = self.marker_excursion_entry.text()
+        self.marker_excursion_entry.clear()
+        if excursion:
+            self.marker_excursion_entry.setPlaceholderText(excursion)
+            self.peak_search.excursion = float(excursion)
+    
+    
+    def set_marker_tracking(self, enabled: bool) -> None:
+        """Turns peak tracking on or off
+
+        Args:
+            enabled (bool): True to keep every marker on the same peak from sweep to sweep
+        """
+        self.peak_search.tracking = enabled
+        self.peak_search.reset()
+    
+    
+    def process_new_traces(self) -> np.ndarray | None:
+        """Runs the detector over every trace read since the last update, including the ones the plot skipped
+
+        Returns:
+            np.ndarray | None: The processed trace, None if the detector is off or there was nothing new
+        """
+        if self.processor.detector == TraceProcessor.OFF:
+            return None
+        
+        history = self.history
+        with history.lock:
+            traces, self.processed_seen = history.since(self.processed_seen)
+            for trace in traces:
+                self.processor.process(trace)
+        
+        return self.processor.output if self.processor.traces else None
+    
+    
+    def set_detector(self, detector: str) -> None:
+        """Changes the detector, it starts from the next trace
+
+        Args:
+            detector (str): One of TraceProcessor.DETECTORS
+        """
+        self.processor.set_detector(detector)
+        self.processed_seen = self.history.count
+        if detector == TraceProcessor.OFF:
+            self._processed_y = None
+            self.processed_line.clear()
+    
+    
+    def set_detector_count(self) -> None:
+        """Changes the number of traces the detector averages"""
+        count = self.detector_count_entry.text()
+        self.detector_count_entry.clear()
+        if count:
+            self.detector_count_entry.setPlaceholderText(count)
+            self.processor.set_count(int(count))
+            self.processed_seen = self.history.count
+    
+    
+    def reset_detector(self) -> None:
+        """Restarts the average or hold from the next trace"""
+        self.processor.reset()
+        self.processed_seen = self.history.count
     
     
     def start_update(self) -> None:
         self.do_updates = True
+        self.acquisition.set_view_active(self, self.isVisible())
         self.update_off_button.setDisabled(False)
         self.update_on_button.setDisabled(True)
     
     
     def stop_update(self) -> None:
         self.do_updates = False
+        self.acquisition.set_view_active(self, False)
         self.update_off_button.setDisabled(True)
         self.update_on_button.setDisabled(False)
     
@@ -156,7 +570,7 @@ class SpectralWidget(QWidget):
         period = self.update_period_entry.text()
         self.update_period_entry.clear()
         self.update_period_entry.setPlaceholderText(period)
-        self.timer.setInterval(int(period))
+        self.acquisition.set_update_period(int(period))
     
     
     def start_logging_action(self):
@@ -193,4 +607,8 @@ class SpectralWidget(QWidget):
         QMessageBox.warning(self, "Logging Error", error_message)
 
 
+    def on_acquisition_error(self, error_message: str):
+        print(error_message)
+
+
 
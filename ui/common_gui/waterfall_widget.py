@@ -0,0 +1,121 @@
+# waterfall_widget.py
+
+from PySide6.QtCore import QRectF
+import pyqtgraph as pg
+import numpy as np
+
+
+class WaterfallWidget(pg.PlotWidget):
+    def __init__(self, rows:int = 200, levels:tuple[float, float] = (-100, 10), colormap:str = "viridis", parent=None):
+        """Scrolling waterfall of the latest traces, the newest trace is the top row
+
+        Every trace is first reduced to one value per pixel column, the highest point in the column so narrow peaks
+        stay visible. The image is a ring of RGBA rows that is twice as high as the view, every row is written twice so
+        the shown rows are always one contiguous slice. A new trace only colors its own row, the older rows are never
+        touched again, and the image handed to pyqtgraph is rows x pixel columns whatever the number of trace points.
+
+        Args:
+            rows (int, optional): Number of traces shown. Defaults to 200.
+            levels (tuple[float, float], optional): Power in dBm of the bottom and the top of the color map. Defaults to (-100, 10).
+            colormap (str, optional): Name of a pyqtgraph color map. Defaults to "viridis".
+            parent (QWidget, optional): The parent widget. Defaults to None.
+        """
+        super().__init__(parent)
+
+        self.rows = rows
+        self.levels = levels
+        self.lut = pg.colormap.get(colormap).getLookupTable(nPts=256, alpha=True) # (256, 4) uint8
+
+        self.image = pg.ImageItem(axisOrder='row-major')
+        self.addItem(self.image)
+
+        self.setBackground('w')
+        self.setLabel('left', 'Traces')
+        self.getPlotItem().setMouseEnabled(y=False)
+
+        self.points = 0
+        self.columns = 0 # Pixel columns of the image, one value per column of every trace
+        self.row = 0 # Row the next trace is written to
+        self.seen = 0 # Sequence number of the next history trace to draw
+        self.x_range = (0.0, 1.0)
+        self.buffer = None
+
+
+    def set_x_axis(self, start:float, stop:float, label:str) -> None:
+        """Places the image on the trace's frequency or time axis
+
+        Args:
+            start (float): First x value
+            stop (float): Last x value
+            label (str): Label of the bottom axis
+        """
+        if (start, stop) != self.x_range:
+            self.x_range = (start, stop)
+            self.image.setRect(QRectF(start, 0, stop - start, self.rows))
+            self.setLabel('bottom', label)
+
+
+    def clear_traces(self) -> None:
+        """Empties the waterfall"""
+        if self.buffer is not None:
+            self.buffer[:] = 0
+            self._show()
+
+
+    def _allocate(self, points:int) -> None:
+        """Allocates the image for traces of a length, which clears the waterfall"""
+        width = int(self.getViewBox().width()) or self.width()
+        self.points = points
+        self.columns = max(1, min(points, width))
+        self.row = 0
+        self.buffer = np.zeros((2 * self.rows, self.columns, 4), dtype=np.uint8)
+        self._edges = np.linspace(0, points, self.columns, endpoint=False).astype(np.intp) # First point of every column
+        self._reduced = np.empty(self.columns, dtype=np.float32)
+        self._scaled = np.empty(self.columns, dtype=np.float32)
+        self._index = np.empty(self.columns, dtype=np.intp)
+        self.image.setRect(QRectF(self.x_range[0], 0, self.x_range[1] - self.x_range[0], self.rows))
+
+
+    def add_trace(self, trace:np.ndarray) -> None:
+        """Colors one trace into the next row, without showing it yet
+
+        Args:
+            trace (np.ndarray): Trace in dBm
+        """
+        if self.buffer is None or len(trace) != self.points:
+            self._allocate(len(trace))
+
+        low, high = self.levels
+
+        np.maximum.reduceat(trace, self._edges, out=self._reduced) # Highest point of every pixel column
+
+        # dBm to color map index, without temporary arrays
+        np.subtract(self._reduced, low, out=self._scaled)
+        np.multiply(self._scaled, 255 / (high - low), out=self._scaled)
+        np.clip(self._scaled, 0, 255, out=self._scaled)
+        self._index[:] = self._scaled
+
+        np.take(self.lut, self._index, axis=0, out=self.buffer[self.row])
+        self.buffer[self.row + self.rows] = self.buffer[self.row]
+
+        self.row = (self.row + 1) % self.rows
+
+
+    def update_from_history(self, history) -> None:
+        """Draws the traces that were added to a trace history since the last call, so traces the plot skipped still get a row
+
+        Args:
+            history (TraceRingBuffer): History of the traces of this mode
+        """
+        with history.lock:
+            traces, self.seen = history.since(self.seen)
+            for trace in traces[-self.rows:]:
+                self.add_trace(trace)
+
+        if len(traces):
+            self._show()
+
+
+    def _show(self) -> None:
+        """Shows the latest rows, oldest at the bottom"""
+        self.image.setImage(self.buffer[self.row:self.row + self.rows], autoLevels=False)
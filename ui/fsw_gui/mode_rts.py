@@ -6,7 +6,6 @@ from PySide6.QtWidgets import (
 from ui.common_gui.mode_super import ModeSuper
 from ui.common_gui.trace_widget import SpectralWidget
 from ui.common.utilities import save_file_dialog, open_file_dialog
-from ui.common_gui.spectrogram_window import SpectrogramWindow
 from datetime import datetime
 from pathlib import Path
 import numpy as np
@@ -97,70 +96,84 @@ class ModeRts(ModeSuper):
     
     
     def read_spectrogram_csv(self, file_path):
-        # Initialize lists to store data
-        frequencies = []
-        times = []
-        amplitudes = []
-        
-        # Read the file
-        with open(file_path, 'r') as file:
-            # Skip header until we find first "Frame"
-            for line in file:
-                if line.startswith('Frame'):
-                    break
-                # You can add header parsing here if needed
-                
-            current_time = None
-            
-            # Read the rest of the file
-            for line in file:
-                line = line.strip()
-                if not line:
-                    continue
-                    
-                parts = line.split(';')
-                
-                if line.startswith('Frame'):
-                    # New frame/time step
-                    current_time = -int(parts[1])
-                elif line.startswith('Timestamp'):
-                    continue
-                else:
-                    # This is frequency-amplitude pair
-                    try:
-                        freq = float(parts[0])
-                        amp = float(parts[1])
-                        
-                        frequencies.append(freq)
-                        times.append(current_time)
-                        amplitudes.append(amp)
-                    except:
-                        continue
-        
-        # Convert to numpy arrays
-        frequencies = np.array(frequencies)
-        times = np.array(times)
-        amplitudes = np.array(amplitudes)
-        
-        # Get unique frequencies and times
-        unique_freqs = np.sort(np.unique(frequencies))
-        unique_times = np.sort(np.unique(times))
-        
-        # Create 2D array for spectrogram
-        spec_data = np.zeros((len(unique_freqs), len(unique_times)))
-        
-        # Fill the 2D array
-        for f, t, a in zip(frequencies, times, amplitudes):
-            i = np.where(unique_freqs == f)[0][0]
-            j = np.where(unique_times == t)[0][0]
-            spec_data[i, j] = a
-        
-        return spec_data, unique_freqs, unique_times
+        return read_spectrogram_csv(file_path)
 
     def plot_spectrogram(self):
         filename = open_file_dialog("Select csv file to open", "spectrograms", ".csv", self)
         
         spec_data, unique_freqs, unique_times = self.read_spectrogram_csv(filename)
         
+        from ui.common_gui.spectrogram_window import SpectrogramWindow # matplotlib is slow to import, only load it when a plot is opened
+        
         self.spec_window = SpectrogramWindow(spec_data, unique_freqs, unique_times)
         self.spec_window.show()
+
+
+def read_spectrogram_csv(file_path):
+    """Reads a spectrogram CSV exported by the FSW
+
+    Args:
+        file_path (str): Path to the CSV file
+
+    Returns:
+        tuple: 2D array of amplitudes (frequency x time), the sorted frequencies and the sorted times
+    """
+    # Initialize lists to store data
+    frequencies = []
+    times = []
+    amplitudes = []
+    
+    # Read the file
+    with open(file_path, 'r') as file:
+        # Skip header until we find first "Frame"
+        for line in file:
+            if line.startswith('Frame'):
+                break
+            # You can add header parsing here if needed
+            
+        current_time = None
+        
+        # Read the rest of the file
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+                
+            parts = line.split(';')
+            
+            if line.startswith('Frame'):
+                # New frame/time step
+                current_time = -int(parts[1])
+            elif line.startswith('Timestamp'):
+                continue
+            else:
+                # This is frequency-amplitude pair
+                try:
+                    freq = float(parts[0])
+                    amp = float(parts[1])
+                    
+                    frequencies.append(freq)
+                    times.append(current_time)
+                    amplitudes.append(amp)
+                except:
+                    continue
+    
+    # Convert to numpy arrays
+    frequencies = np.array(frequencies)
+    times = np.array(times)
+    amplitudes = np.array(amplitudes)
+    
+    # Get unique frequencies and times
+    unique_freqs = np.sort(np.unique(frequencies))
+    unique_times = np.sort(np.unique(times))
+    
+    # Create 2D array for spectrogram
+    spec_data = np.zeros((len(unique_freqs), len(unique_times)))
+    
+    # Fill the 2D array
+    for f, t, a in zip(frequencies, times, amplitudes):
+        i = np.where(unique_freqs == f)[0][0]
+        j = np.where(unique_times == t)[0][0]
+        spec_data[i, j] = a
+    
+    return spec_data, unique_freqs, unique_times